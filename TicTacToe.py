@@ -2,31 +2,50 @@
 Monte Carlo Tic-Tac-Toe Player
 """
 
+import math
+import multiprocessing
 import random
+import time
 import poc_ttt_gui
 import poc_ttt_provided as provided
+import poc_ttt_testsuite
+
+# NumPy is only needed by the vectorized rollouts
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Constants for Monte Carlo simulator
 # Change as desired
 NTRIALS = 10000  # Number of trials to run
 MCMATCH = 2.0  # Score for squares played by the machine player
 MCOTHER = 1.0  # Score for squares played by the other player
+MCBATCH = 65536  # Number of games played at once by the vectorized rollouts
+MCCONFIDENCE = 0.95  # Confidence at which the adaptive search stops early
+MCTOLERANCE = 0.01  # Difference in win rate below which the adaptive search treats moves as equal
+
+# Worker pools of the parallel rollouts by number of workers, started on first use and kept across moves
+POOLS = {}
 
 
 # Add your functions here.
 
-def mc_trial(board, player):
+def mc_trial(board, player, rng=random):
     """
     This function takes a current board and the next player to move.
     The function plays a game starting with the given player by making random moves, alternating between players.
-    The function returns when the game is over.
-    The modified board will contain the state of the game.
+    The function returns the number of moves made when the game is over.
+    The modified board will contain the state of the game, and undo_move can restore it.
+    Moves are chosen with rng, a random.Random or the random module.
     """
+    moves = 0
     while board.check_win() is None:
-        empty_squares = board.get_empty_squares()
-        (row, col) = empty_squares[random.randint(0, len(empty_squares) - 1)]
-        board.move(row, col, player)
+        (row, col) = board.random_empty_square(rng)
+        board.make_move(row, col, player)
         player = provided.switch_player(player)
+        moves += 1
+    return moves
 
 
 def mc_update_scores(scores, board, player):
@@ -36,18 +55,19 @@ def mc_update_scores(scores, board, player):
     The function scores the completed board and updates the scores grid.
     """
     winner = board.check_win()
-    dim = board.get_dim()
+    height = board.get_height()
+    width = board.get_width()
     if winner == player:
-        for row in range(dim):
-            for col in range(dim):
+        for row in range(height):
+            for col in range(width):
                 square = board.square(row, col)
                 if square == player:
                     scores[row][col] += MCMATCH
                 elif square != provided.EMPTY:
                     scores[row][col] -= MCOTHER
     elif winner != provided.DRAW and winner is not None:
-        for row in range(dim):
-            for col in range(dim):
+        for row in range(height):
+            for col in range(width):
                 square = board.square(row, col)
                 if square == player:
                     scores[row][col] -= MCMATCH
@@ -76,18 +96,231 @@ def get_best_move(board, scores):
     return square
 
 
-def mc_move(board, player, trials):
+def mc_scores(board, player, trials, rng=random):
+    """
+    This function runs the given number of trials on the board and returns the resulting grid of scores.
+    The board is left unchanged.
+    """
+    scores = [[0 for dummycol in range(board.get_width())] for dummyrow in range(board.get_height())]
+    for dummy in range(trials):
+        moves = mc_trial(board, player, rng)
+        mc_update_scores(scores, board, player)
+        for dummy_move in range(moves):
+            board.undo_move()
+    return scores
+
+
+def mc_worker_scores(job):
+    """
+    This function runs the trials of one worker process, given as a (board, player, trials, seed) tuple,
+    with its own random.Random seeded by seed.
+    """
+    board, player, trials, seed = job
+    return mc_scores(board, player, trials, random.Random(seed))
+
+
+def get_pool(workers):
+    """
+    This function returns the shared pool of the given number of worker processes, starting it on first use.
+    """
+    if workers not in POOLS:
+        POOLS[workers] = multiprocessing.Pool(workers)
+    return POOLS[workers]
+
+
+def close_pools():
+    """
+    This function shuts down the shared worker pools, they are started again on the next parallel move.
+    """
+    for pool in POOLS.values():
+        pool.close()
+        pool.join()
+    POOLS.clear()
+
+
+def mc_parallel_scores(board, player, trials, workers, seed=None, pool=None):
+    """
+    This function splits the trials across worker processes and returns the sum of their grids of scores.
+    Each worker gets a seed drawn from random.Random(seed), so the scores are reproducible for a fixed seed
+    and number of workers.
+    The jobs run on the given multiprocessing pool, or else on the shared pool of that many workers, so
+    processes are started once and not on every move.
+    """
+    seed_rng = random.Random(seed)
+    jobs = []
+    for idx in range(workers):
+        worker_trials = trials // workers + (1 if idx < trials % workers else 0)
+        jobs.append((board, player, worker_trials, seed_rng.getrandbits(32)))
+    if pool is None:
+        pool = get_pool(workers)
+    worker_scores = pool.map(mc_worker_scores, jobs)
+    return [[sum([grid[row][col] for grid in worker_scores]) for col in range(board.get_width())]
+            for row in range(board.get_height())]
+
+
+def mc_batch_scores(board, player, trials, seed=None):
+    """
+    This function plays the trials with NumPy, MCBATCH games at a time, and returns the same grid of scores as
+    mc_scores would for the same number of random games.
+    Each game is a random fill order of the empty squares, the game ends at the first move that completes a line.
+    """
+    width = board.get_width()
+    size = board.get_height() * width
+    scores = [[0.0 for dummycol in range(width)] for dummyrow in range(board.get_height())]
+    if board.check_win() is not None:
+        mc_update_scores(scores, board, player)
+        return [[score * trials for score in row] for row in scores]
+
+    other = provided.switch_player(player)
+    squares = [board.square(index // width, index % width) for index in range(size)]
+    empty = [index for index in range(size) if squares[index] == provided.EMPTY]
+    empty_pos = dict([(index, pos) for pos, index in enumerate(empty)])
+    never = len(empty)
+
+    # for each line and player who can still complete it, the positions of its empty squares
+    line_squares = []
+    for mask in board.get_win_masks():
+        line = [index for index in range(size) if mask & (1 << index)]
+        owners = set([squares[index] for index in line]) - set([provided.EMPTY])
+        for line_player in (player, other):
+            if owners <= set([line_player]):
+                line_squares.append((line_player, [empty_pos[index] for index in line
+                                                   if squares[index] == provided.EMPTY]))
+
+    rng = numpy.random.default_rng(seed)
+    empty_scores = numpy.zeros(len(empty))
+    total_sign = 0
+    done = 0
+    while done < trials:
+        games = min(MCBATCH, trials - done)
+        done += games
+        # order[game, pos] is the move number at which empty square pos is filled,
+        # even move numbers belong to player
+        order = rng.random((games, len(empty))).argsort(axis=1).argsort(axis=1)
+        mine = order % 2 == 0
+        first_win = {player: numpy.full(games, never), other: numpy.full(games, never)}
+        for line_player, positions in line_squares:
+            owned = mine[:, positions] if line_player == player else ~mine[:, positions]
+            completed = numpy.where(owned.all(axis=1), order[:, positions].max(axis=1), never)
+            numpy.minimum(first_win[line_player], completed, out=first_win[line_player])
+        sign = numpy.where(first_win[player] < first_win[other], 1,
+                           numpy.where(first_win[other] < first_win[player], -1, 0))
+        if board.get_reverse():
+            sign = -sign
+        end = numpy.minimum(first_win[player], first_win[other])
+        filled = order <= end[:, numpy.newaxis]
+        weights = numpy.where(mine, MCMATCH, -MCOTHER)
+        empty_scores += (sign[:, numpy.newaxis] * filled * weights).sum(axis=0)
+        total_sign += int(sign.sum())
+
+    for index in range(size):
+        row, col = index // width, index % width
+        if squares[index] == player:
+            scores[row][col] = total_sign * MCMATCH
+        elif squares[index] == other:
+            scores[row][col] = -total_sign * MCOTHER
+        else:
+            scores[row][col] = float(empty_scores[empty_pos[index]])
+    return scores
+
+
+def mc_vector_move(board, player, trials, seed=None):
+    """
+    This function returns a move like mc_move, playing the trials with the vectorized rollouts.
+    It falls back to mc_move when NumPy is not available.
+    """
+    if numpy is None:
+        return mc_move(board, player, trials, seed=seed)
+    return get_best_move(board, mc_batch_scores(board, player, trials, seed))
+
+
+def mc_rollout_value(board, player, square, rng=random):
+    """
+    This function plays square for player followed by a random game and returns 1.0 if player wins, 0.5 for
+    a draw and 0.0 if player loses. The board is left unchanged.
+    """
+    board.make_move(square[0], square[1], player)
+    moves = mc_trial(board, provided.switch_player(player), rng) + 1
+    winner = board.check_win()
+    for dummy_move in range(moves):
+        board.undo_move()
+    if winner == player:
+        return 1.0
+    elif winner == provided.DRAW:
+        return 0.5
+    return 0.0
+
+
+def mc_adaptive_search(board, player, trials, confidence=MCCONFIDENCE, time_limit=None, rng=random,
+                       tolerance=MCTOLERANCE):
+    """
+    This function spends at most trials rollouts on the candidate moves, choosing where to spend them with
+    upper and lower confidence bounds (LUCB). It stops early once the best move's lower bound clears every
+    other move's upper bound, less tolerance, at the given confidence, or when time_limit seconds have passed.
+    The function returns a (move, rollouts used) tuple.
+    """
+    candidates = board.get_empty_squares()
+    if len(candidates) <= 1:
+        return (candidates[0] if candidates else None), 0
+    deadline = None if time_limit is None else time.time() + time_limit
+    delta = 1.0 - confidence
+    totals = [0.0] * len(candidates)
+    plays = [0] * len(candidates)
+
+    def bound(idx):
+        """
+        Hoeffding radius of a candidate, with a union bound over candidates and rollout counts.
+        """
+        return math.sqrt(math.log(4.0 * len(candidates) * plays[idx] ** 2 / delta) / (2.0 * plays[idx]))
+
+    def sample(idx):
+        """
+        Add one rollout to a candidate.
+        """
+        totals[idx] += mc_rollout_value(board, player, candidates[idx], rng)
+        plays[idx] += 1
+
+    for idx in range(min(len(candidates), trials)):
+        sample(idx)
+    used = min(len(candidates), trials)
+    while used < trials and (deadline is None or time.time() < deadline):
+        means = [totals[idx] / plays[idx] if plays[idx] else 0.0 for idx in range(len(candidates))]
+        best = max(range(len(candidates)), key=lambda idx: means[idx])
+        upper = [means[idx] + bound(idx) if plays[idx] else float("inf") for idx in range(len(candidates))]
+        challenger = max([idx for idx in range(len(candidates)) if idx != best], key=lambda idx: upper[idx])
+        if means[best] - bound(best) > upper[challenger] - tolerance:
+            break
+        sample(best)
+        used += 1
+        if used < trials:
+            sample(challenger)
+            used += 1
+    means = [totals[idx] / plays[idx] if plays[idx] else 0.0 for idx in range(len(candidates))]
+    best = max(range(len(candidates)), key=lambda idx: means[idx])
+    return candidates[best], used
+
+
+def mc_adaptive_move(board, player, trials):
+    """
+    This function returns a move like mc_move, using at most trials rollouts of the adaptive search.
+    """
+    return mc_adaptive_search(board, player, trials)[0]
+
+
+def mc_move(board, player, trials, workers=1, seed=None, pool=None):
     """
     This function takes a current board, which player the machine player is, and the number of trials to run.
     The function uses the Monte Carlo simulation to return a move for the machine player in the form of a
     (row, column) tuple.
+    With workers > 1 the trials run in that many processes, of the given pool or of a shared one kept across
+    moves. If seed is given the move is reproducible for a fixed number of workers.
     """
-    dim = board.get_dim()
-    scores = [[0 for dummycol in range(dim)] for dummyrow in range(dim)]
-    for dummy in range(trials):
-        current_board = board.clone()
-        mc_trial(current_board, player)
-        mc_update_scores(scores, current_board, player)
+    if workers > 1:
+        scores = mc_parallel_scores(board, player, trials, workers, seed, pool)
+    elif seed is not None:
+        scores = mc_scores(board, player, trials, random.Random(seed))
+    else:
+        scores = mc_scores(board, player, trials)
     return get_best_move(board, scores)
 
 
@@ -96,5 +329,7 @@ def mc_move(board, player, trials):
 # Both should be commented out when you submit for
 # testing to save time.
 
-provided.play_game(mc_move, NTRIALS, False)
-poc_ttt_gui.run_gui(3, provided.PLAYERX, mc_move, NTRIALS, False)
+if __name__ == "__main__":
+    poc_ttt_testsuite.run_suite(provided.MNKBoard)
+    provided.play_game(mc_move, NTRIALS, False)
+    poc_ttt_gui.run_gui(3, provided.PLAYERX, mc_move, NTRIALS, False)
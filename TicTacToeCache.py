@@ -0,0 +1,153 @@
+"""
+Cache of Tic-Tac-Toe player moves by canonical position
+"""
+
+import collections
+import shelve
+import poc_ttt_provided as provided
+
+# Number of positions kept in memory by default
+CACHE_SIZE = 10000
+
+
+class MoveCache:
+    """
+    Wraps a player function such as mc_move, move_wrapper or mm_move
+    and remembers its results across games.
+
+    The wrapper is called exactly like the function, (board, player,
+    ...), keyword arguments included. Positions are looked up by the
+    canonical form of the board over its symmetries together with the
+    board shape, the player, the reverse flag and the remaining
+    arguments, such as the number of trials or the seed, so a position
+    seen in any rotation or reflection is a hit.
+    Moves are stored in canonical coordinates and mapped back onto the
+    board they are asked for.
+
+    The most recently used maxsize positions are kept in memory. If
+    path is given, every result is also written to a shelve file there,
+    which is read on memory misses and survives across runs.
+    """
+
+    def __init__(self, move_function, maxsize=CACHE_SIZE, path=None):
+        self._move_function = move_function
+        self._maxsize = maxsize
+        self._path = path
+        self._shelf = None
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def __call__(self, board, player, *args, **kwargs):
+        """
+        Return move_function(board, player, *args, **kwargs), from the
+        cache if the position was seen before
+        """
+        canonical, perm = provided.canonical_form(board)
+        key = (canonical, board.get_height(), board.get_width(), board.get_win_length(),
+               player, board.get_reverse()) + args + tuple(sorted(kwargs.items()))
+        if key in self._entries:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            entry = self._entries[key]
+        else:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._disk_hits += 1
+            else:
+                self._misses += 1
+                result = self._move_function(board, player, *args, **kwargs)
+                entry = self._to_canonical(result, board.get_width(), perm)
+                self._write_disk(key, entry)
+            self._entries[key] = entry
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return self._from_canonical(entry, board.get_width(), perm)
+
+    def get_stats(self):
+        """
+        Return a dictionary with the number of memory hits, disk hits
+        and misses and the hit rate over all calls
+        """
+        calls = self._hits + self._disk_hits + self._misses
+        hit_rate = 0.0
+        if calls:
+            hit_rate = float(self._hits + self._disk_hits) / calls
+        return {"hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "size": len(self._entries),
+                "hit_rate": hit_rate}
+
+    def clear(self):
+        """
+        Forget the positions kept in memory and reset the statistics,
+        the disk tier is left untouched
+        """
+        self._entries.clear()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def close(self):
+        """
+        Close the disk tier, it is reopened on the next miss
+        """
+        if self._shelf is not None:
+            self._shelf.close()
+            self._shelf = None
+
+    def __getstate__(self):
+        """
+        Pickle the cache without its open shelf, so it can be sent to
+        worker processes
+        """
+        state = self.__dict__.copy()
+        state["_shelf"] = None
+        return state
+
+    def _read_disk(self, key):
+        """
+        Return the entry stored on disk for key, or None
+        """
+        if self._path is None:
+            return None
+        if self._shelf is None:
+            self._shelf = shelve.open(self._path)
+        return self._shelf.get(repr(key))
+
+    def _write_disk(self, key, entry):
+        """
+        Store the entry on disk under key
+        """
+        if self._path is not None:
+            self._shelf[repr(key)] = entry
+
+    @staticmethod
+    def _to_canonical(result, width, perm):
+        """
+        Convert a move, or a (score, move) tuple, to canonical
+        coordinates
+        """
+        if isinstance(result[1], tuple):
+            return result[0], MoveCache._to_canonical(result[1], width, perm)
+        row, col = result
+        if row < 0:
+            return result
+        index = perm.index(row * width + col)
+        return index // width, index % width
+
+    @staticmethod
+    def _from_canonical(entry, width, perm):
+        """
+        Convert a move, or a (score, move) tuple, from canonical
+        coordinates back to those of the board
+        """
+        if isinstance(entry[1], tuple):
+            return entry[0], MoveCache._from_canonical(entry[1], width, perm)
+        row, col = entry
+        if row < 0:
+            return entry
+        index = perm[row * width + col]
+        return index // width, index % width
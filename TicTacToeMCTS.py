@@ -0,0 +1,279 @@
+"""
+Monte Carlo Tree Search (UCT) Tic-Tac-Toe Player
+"""
+
+import math
+import time
+from array import array
+import poc_ttt_gui
+import poc_ttt_provided as provided
+
+# Search constants
+# Change as desired
+NITERATIONS = 100000  # Maximum number of iterations per move
+TIME_LIMIT = 1.0  # Maximum number of seconds per move
+EXPLORATION = 1.4  # Weight of the exploration term of UCT
+NODE_LIMIT = 2000000  # Nodes stop being expanded once the pool holds this many
+
+
+class MCTSPlayer:
+    """
+    UCT player that keeps its search tree between moves.
+
+    Nodes live in parallel arrays indexed by node number. The children
+    of a node are a linked list through first_child and next_sibling,
+    and a node's wins are counted for the player who moved into it.
+    """
+
+    def __init__(self, time_limit=TIME_LIMIT, exploration=EXPLORATION):
+        """
+        Create a player with an empty tree
+        """
+        self._time_limit = time_limit
+        self._exploration = exploration
+        self._new_tree()
+
+    def _new_tree(self):
+        """
+        Drop the tree and create empty node pools
+        """
+        self._parent = array("i")
+        self._first_child = array("i")
+        self._next_sibling = array("i")
+        self._square = array("i")
+        self._expanded = array("b")
+        self._visits = array("i")
+        self._wins = array("d")
+        self._root = -1
+        self._root_squares = None
+        self._root_player = None
+        self._root_reverse = None
+
+    def _add_node(self, parent, square):
+        """
+        Add a node for the move to square and return its number
+        """
+        self._parent.append(parent)
+        self._first_child.append(-1)
+        self._next_sibling.append(-1)
+        self._square.append(square)
+        self._expanded.append(0)
+        self._visits.append(0)
+        self._wins.append(0.0)
+        return len(self._square) - 1
+
+    def get_num_nodes(self):
+        """
+        Return the number of nodes in the pools
+        """
+        return len(self._square)
+
+    def get_root_visits(self):
+        """
+        Return the number of iterations stored under the root
+        """
+        if self._root < 0:
+            return 0
+        return self._visits[self._root]
+
+    def move(self, board, player, iterations):
+        """
+        Search from the board for at most iterations iterations or the
+        time limit, and return the most visited move as a (row, col)
+        tuple
+        """
+        deadline = time.time() + self._time_limit
+        width = board.get_width()
+        self._set_root(board, player)
+        work_board = board.clone()
+        for dummy_idx in range(iterations):
+            if time.time() > deadline:
+                break
+            self._iterate(work_board, player, width)
+
+        best = -1
+        child = self._first_child[self._root]
+        while child >= 0:
+            if best < 0 or self._visits[child] > self._visits[best]:
+                best = child
+            child = self._next_sibling[child]
+        if best < 0:
+            return None
+        return self._square[best] // width, self._square[best] % width
+
+    def _set_root(self, board, player):
+        """
+        Move the root to the node of the board if the tree holds it,
+        keeping only its subtree, or start a new tree
+        """
+        width = board.get_width()
+        squares = [board.square(index // width, index % width)
+                   for index in range(board.get_height() * width)]
+        node = self._find_node(squares, player, board.get_reverse())
+        if node < 0:
+            self._new_tree()
+            node = self._add_node(-1, -1)
+        elif node != self._root:
+            node = self._compact(node)
+        self._root = node
+        self._root_squares = squares
+        self._root_player = player
+        self._root_reverse = board.get_reverse()
+
+    def _find_node(self, squares, player, reverse):
+        """
+        Return the node reached from the root by the moves that turn
+        the root board into squares, or -1 if there is none
+        """
+        if (self._root < 0 or self._root_player != player or self._root_reverse != reverse
+                or len(self._root_squares) != len(squares)):
+            return -1
+        new_moves = {}
+        for index in range(len(squares)):
+            if self._root_squares[index] != squares[index]:
+                if self._root_squares[index] != provided.EMPTY:
+                    return -1
+                new_moves[index] = squares[index]
+        # the moves alternate between the players, starting with player
+        node = self._root
+        to_move = player
+        while new_moves:
+            moved = [index for index in new_moves if new_moves[index] == to_move]
+            if len(moved) != 1 or not self._expanded[node]:
+                return -1
+            child = self._first_child[node]
+            while child >= 0 and self._square[child] != moved[0]:
+                child = self._next_sibling[child]
+            if child < 0:
+                return -1
+            del new_moves[moved[0]]
+            node = child
+            to_move = provided.switch_player(to_move)
+        return node
+
+    def _compact(self, node):
+        """
+        Copy the subtree under node into new pools and return the new
+        number of node
+        """
+        old_first_child, old_next_sibling = self._first_child, self._next_sibling
+        old_square, old_expanded = self._square, self._expanded
+        old_visits, old_wins = self._visits, self._wins
+        self._new_tree()
+        new_root = self._add_node(-1, old_square[node])
+        self._expanded[new_root] = old_expanded[node]
+        self._visits[new_root] = old_visits[node]
+        self._wins[new_root] = old_wins[node]
+        pending = [(node, new_root)]
+        while pending:
+            old_node, new_node = pending.pop()
+            old_child = old_first_child[old_node]
+            previous = -1
+            while old_child >= 0:
+                new_child = self._add_node(new_node, old_square[old_child])
+                self._expanded[new_child] = old_expanded[old_child]
+                self._visits[new_child] = old_visits[old_child]
+                self._wins[new_child] = old_wins[old_child]
+                if previous < 0:
+                    self._first_child[new_node] = new_child
+                else:
+                    self._next_sibling[previous] = new_child
+                previous = new_child
+                pending.append((old_child, new_child))
+                old_child = old_next_sibling[old_child]
+        return new_root
+
+    def _iterate(self, board, player, width):
+        """
+        Run one selection, expansion, rollout and backup from the root
+        """
+        node = self._root
+        path = [(node, provided.switch_player(player))]
+        to_move = player
+        moves = 0
+
+        # selection
+        while self._expanded[node] and self._first_child[node] >= 0:
+            node = self._select_child(node)
+            board.make_move(self._square[node] // width, self._square[node] % width, to_move)
+            moves += 1
+            path.append((node, to_move))
+            to_move = provided.switch_player(to_move)
+
+        # expansion
+        if board.check_win() is None and len(self._square) < NODE_LIMIT:
+            for row, col in board.get_empty_squares():
+                child = self._add_node(node, row * width + col)
+                self._next_sibling[child] = self._first_child[node]
+                self._first_child[node] = child
+            self._expanded[node] = 1
+            node = self._select_child(node)
+            board.make_move(self._square[node] // width, self._square[node] % width, to_move)
+            moves += 1
+            path.append((node, to_move))
+            to_move = provided.switch_player(to_move)
+
+        # rollout
+        while board.check_win() is None:
+            row, col = board.random_empty_square()
+            board.make_move(row, col, to_move)
+            moves += 1
+            to_move = provided.switch_player(to_move)
+        winner = board.check_win()
+        for dummy_move in range(moves):
+            board.undo_move()
+
+        # backup
+        for node, mover in path:
+            self._visits[node] += 1
+            if winner == mover:
+                self._wins[node] += 1.0
+            elif winner == provided.DRAW:
+                self._wins[node] += 0.5
+
+    def _select_child(self, node):
+        """
+        Return the child of node with the highest UCT value, unvisited
+        children first
+        """
+        log_visits = math.log(max(self._visits[node], 1))
+        best = -1
+        best_value = None
+        child = self._first_child[node]
+        while child >= 0:
+            visits = self._visits[child]
+            if visits == 0:
+                value = float("inf")
+            else:
+                value = (self._wins[child] / visits
+                         + self._exploration * math.sqrt(log_visits / visits))
+            if best_value is None or value > best_value:
+                best = child
+                best_value = value
+            child = self._next_sibling[child]
+        return best
+
+
+# Player used by move_wrapper, its tree is reused across moves
+PLAYER = MCTSPlayer()
+
+
+def move_wrapper(board, player, trials):
+    """
+    Wrapper to allow the use of the same infrastructure that was used
+    for Monte Carlo Tic-Tac-Toe, trials is the maximum number of
+    iterations.
+    """
+    move = PLAYER.move(board, player, trials)
+    assert move is not None, "no legal move"
+    return move
+
+
+# Test game with the console or the GUI.
+# Uncomment whichever you prefer.
+# Both should be commented out when you submit for
+# testing to save time.
+
+if __name__ == "__main__":
+    provided.play_game(move_wrapper, NITERATIONS, False)
+    poc_ttt_gui.run_gui(5, provided.PLAYERO, move_wrapper, NITERATIONS, False)
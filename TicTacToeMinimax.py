@@ -2,6 +2,7 @@
 Mini-max Tic-Tac-Toe Player
 """
 
+import time
 import poc_ttt_gui
 import poc_ttt_provided as provided
 
@@ -18,6 +19,26 @@ SCORES = {provided.PLAYERX: 1,
           provided.DRAW: 0,
           provided.PLAYERO: -1}
 
+# Transposition table shared by alpha-beta searches, cleared once it
+# holds TABLE_LIMIT positions
+EXACT = 0
+LOWER = 1
+UPPER = 2
+TABLE_LIMIT = 2000000
+TRANSPOSITIONS = {}
+
+# Iterative deepening constants, heuristic scores of open lines stay
+# far below WIN_SCORE
+ID_TIME_LIMIT = 1.0
+WIN_SCORE = 1000000
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a depth-limited search when the deadline passes
+    """
+    pass
+
 
 def mm_move(board, player):
     """
@@ -33,9 +54,9 @@ def mm_move(board, player):
     best_score = None
     best_move = None
     for square in board.get_empty_squares():
-        new_board = board.clone()
-        new_board.move(square[0], square[1], player)
-        score, dummy_move = mm_move(new_board, provided.switch_player(player))
+        board.make_move(square[0], square[1], player)
+        score, dummy_move = mm_move(board, provided.switch_player(player))
+        board.undo_move()
         if score * SCORES[player] == 1:
             return score, square
         elif score == 0:
@@ -48,6 +69,231 @@ def mm_move(board, player):
     return best_score, best_move
 
 
+def ab_search(board, player, alpha, beta):
+    """
+    Negamax alpha-beta search with a transposition table.
+
+    Returns the score of the board for player, who moves next. Positions
+    are stored under their canonical form over the board symmetries,
+    with a bound flag and the best move in canonical coordinates.
+    """
+    winner = board.check_win()
+    if winner is not None:
+        return SCORES[winner] * SCORES[player]
+    canonical, perm = provided.canonical_form(board)
+    key = (canonical, board.get_height(), board.get_width(), board.get_win_length(),
+           player, board.get_reverse())
+    entry = TRANSPOSITIONS.get(key)
+    first_move = None
+    if entry is not None:
+        value, flag, canonical_move = entry
+        if flag == EXACT:
+            return value
+        elif flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+        first_move = perm[canonical_move]
+
+    width = board.get_width()
+    squares = [row * width + col for row, col in board.get_empty_squares()]
+    if first_move is not None:
+        squares.remove(first_move)
+        squares.insert(0, first_move)
+    alpha_orig = alpha
+    best_score = None
+    best_move = None
+    for index in squares:
+        board.make_move(index // width, index % width, player)
+        score = -ab_search(board, provided.switch_player(player), -beta, -alpha)
+        board.undo_move()
+        if best_score is None or score > best_score:
+            best_score = score
+            best_move = index
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+
+    if best_score <= alpha_orig:
+        flag = UPPER
+    elif best_score >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    if len(TRANSPOSITIONS) >= TABLE_LIMIT:
+        TRANSPOSITIONS.clear()
+    TRANSPOSITIONS[key] = (best_score, flag, perm.index(best_move))
+    return best_score
+
+
+def ab_move(board, player):
+    """
+    Make a move on the board with alpha-beta search.
+
+    Returns a tuple with two elements, like mm_move.  The first element
+    is the score of the given board and the second element is the
+    desired move as a tuple, (row, col).
+    """
+    winner = board.check_win()
+    if winner is not None:
+        return SCORES[winner], (-1, -1)
+    work_board = board.clone()
+    best_score = None
+    best_move = None
+    alpha = -1
+    for row, col in board.get_empty_squares():
+        work_board.make_move(row, col, player)
+        score = -ab_search(work_board, provided.switch_player(player), -1, -alpha)
+        work_board.undo_move()
+        if best_score is None or score > best_score:
+            best_score = score
+            best_move = (row, col)
+        alpha = max(alpha, score)
+        if alpha >= 1:
+            break
+    return best_score * SCORES[player], best_move
+
+
+def ab_move_wrapper(board, player, trials):
+    """
+    Wrapper to allow the use of alpha-beta search with the same
+    infrastructure that was used for Monte Carlo Tic-Tac-Toe.
+    """
+    move = ab_move(board, player)
+    assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+    return move[1]
+
+
+def evaluate(board):
+    """
+    Heuristic score of a board from the point of view of PLAYERX.
+
+    Every line that only one player occupies is worth the square of the
+    number of squares they hold, positive for PLAYERX. In reverse play
+    holding open lines is bad, so the score is negated.
+    """
+    xbits = board.get_bits(provided.PLAYERX)
+    obits = board.get_bits(provided.PLAYERO)
+    total = 0
+    for mask in board.get_win_masks():
+        xcount = bin(xbits & mask).count("1")
+        ocount = bin(obits & mask).count("1")
+        if ocount == 0:
+            total += xcount * xcount
+        elif xcount == 0:
+            total -= ocount * ocount
+    if board.get_reverse():
+        return -total
+    return total
+
+
+def id_search(board, player, depth, alpha, beta, ply, deadline, killers):
+    """
+    Depth-limited negamax alpha-beta search for iterative deepening.
+
+    Returns the score of the board for player, who moves next. Wins
+    score WIN_SCORE less the number of plies to reach them, positions
+    at depth 0 are scored by evaluate. killers[ply] holds the moves that
+    last caused a cutoff at that ply, which are searched first. Raises
+    SearchTimeout once deadline passes.
+    """
+    if time.time() > deadline:
+        raise SearchTimeout()
+    winner = board.check_win()
+    if winner is not None:
+        if winner == provided.DRAW:
+            return 0
+        return (WIN_SCORE - ply) * SCORES[winner] * SCORES[player]
+    if depth == 0:
+        return evaluate(board) * SCORES[player]
+
+    squares = board.get_empty_squares()
+    if ply < len(killers):
+        for killer in reversed(killers[ply]):
+            if killer in squares:
+                squares.remove(killer)
+                squares.insert(0, killer)
+    best_score = None
+    for square in squares:
+        board.make_move(square[0], square[1], player)
+        try:
+            score = -id_search(board, provided.switch_player(player), depth - 1,
+                               -beta, -alpha, ply + 1, deadline, killers)
+        finally:
+            board.undo_move()
+        if best_score is None or score > best_score:
+            best_score = score
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            while len(killers) <= ply:
+                killers.append([])
+            if square not in killers[ply]:
+                killers[ply] = ([square] + killers[ply])[:2]
+            break
+    return best_score
+
+
+def id_move(board, player, time_limit=ID_TIME_LIMIT):
+    """
+    Make a move on the board with iterative deepening alpha-beta search.
+
+    Searches one ply deeper at a time, trying the previous iteration's
+    best move first, until time_limit seconds have passed or the game
+    is solved. Returns a tuple with the score, from the point of view
+    of PLAYERX and in the units of id_search, and the best move of the
+    deepest completed iteration.
+    """
+    winner = board.check_win()
+    if winner is not None:
+        return SCORES[winner] * WIN_SCORE, (-1, -1)
+    deadline = time.time() + time_limit
+    work_board = board.clone()
+    squares = board.get_empty_squares()
+    best_score = 0
+    # if not even depth 1 completes, play the square nearest the center
+    center = ((board.get_height() - 1) / 2.0, (board.get_width() - 1) / 2.0)
+    best_move = min(squares, key=lambda square: abs(square[0] - center[0]) + abs(square[1] - center[1]))
+    killers = []
+    for depth in range(1, len(squares) + 1):
+        if best_move in squares:
+            squares.remove(best_move)
+            squares.insert(0, best_move)
+        alpha = -WIN_SCORE - 1
+        iteration_move = None
+        try:
+            for square in squares:
+                work_board.make_move(square[0], square[1], player)
+                try:
+                    score = -id_search(work_board, provided.switch_player(player), depth - 1,
+                                       -WIN_SCORE - 1, -alpha, 1, deadline, killers)
+                finally:
+                    work_board.undo_move()
+                if iteration_move is None or score > alpha:
+                    alpha = score
+                    iteration_move = square
+        except SearchTimeout:
+            break
+        best_score = alpha
+        best_move = iteration_move
+        if abs(best_score) > WIN_SCORE - len(squares) - 1:
+            # a forced result was found, deeper searches cannot change it
+            break
+    return best_score * SCORES[player], best_move
+
+
+def id_move_wrapper(board, player, trials):
+    """
+    Wrapper to allow the use of iterative deepening search, with a
+    deadline of ID_TIME_LIMIT seconds per move, with the same
+    infrastructure that was used for Monte Carlo Tic-Tac-Toe.
+    """
+    move = id_move(board, player)
+    assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+    return move[1]
+
+
 def move_wrapper(board, player, trials):
     """
     Wrapper to allow the use of the same infrastructure that was used
@@ -63,5 +309,6 @@ def move_wrapper(board, player, trials):
 # Both should be commented out when you submit for
 # testing to save time.
 
-provided.play_game(move_wrapper, 1, False)
-poc_ttt_gui.run_gui(3, provided.PLAYERO, move_wrapper, 1, False)
+if __name__ == "__main__":
+    provided.play_game(move_wrapper, 1, False)
+    poc_ttt_gui.run_gui(3, provided.PLAYERO, move_wrapper, 1, False)
@@ -0,0 +1,161 @@
+"""
+Solved-position table Tic-Tac-Toe Player
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+import poc_ttt_gui
+import poc_ttt_provided as provided
+
+# SCORES are from the point of view of PLAYERX, as in mini-max
+SCORES = {provided.PLAYERX: 1,
+          provided.DRAW: 0,
+          provided.PLAYERO: -1}
+
+# Table layout: one little-endian 16 bit entry per 3x3 board, indexed by
+# the base 3 code of the board (EMPTY 0, PLAYERX 1, PLAYERO 2, square
+# row * 3 + col being digit row * 3 + col), normal play first and then
+# reverse play. Bit 15 marks solved entries, bits 9-10 hold the score
+# plus one and bits 0-8 the squares of the best moves.
+DIM = 3
+NUM_BOARDS = 3 ** (DIM * DIM)
+SOLVED = 1 << 15
+SCORE_SHIFT = 9
+MOVES_MASK = (1 << SCORE_SHIFT) - 1
+DIGITS = {provided.EMPTY: 0, provided.PLAYERX: 1, provided.PLAYERO: 2}
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ttt_solved.bin")
+
+# Memory-mapped table, opened on first use
+TABLE = None
+
+
+def board_code(board):
+    """
+    Return the base 3 code of a 3x3 board
+    """
+    code = 0
+    for index in range(DIM * DIM - 1, -1, -1):
+        code = code * 3 + DIGITS[board.square(index // DIM, index % DIM)]
+    return code
+
+
+def solve(board, player, code, entries, offset):
+    """
+    Store the entry of the board and of every board reachable from it
+    in entries, starting at offset, and return its score
+
+    code is the base 3 code of the board and player moves next
+    """
+    entry = entries[offset + code]
+    if entry & SOLVED:
+        return ((entry >> SCORE_SHIFT) & 3) - 1
+    winner = board.check_win()
+    moves = 0
+    if winner is not None:
+        score = SCORES[winner]
+    else:
+        score = None
+        for row, col in board.get_empty_squares():
+            index = row * DIM + col
+            board.make_move(row, col, player)
+            child_score = solve(board, provided.switch_player(player),
+                                code + DIGITS[player] * 3 ** index, entries, offset)
+            board.undo_move()
+            if score is None or child_score * SCORES[player] > score * SCORES[player]:
+                score = child_score
+                moves = 1 << index
+            elif child_score == score:
+                moves |= 1 << index
+    entries[offset + code] = SOLVED | ((score + 1) << SCORE_SHIFT) | moves
+    return score
+
+
+def build_table(path=TABLE_FILE):
+    """
+    Solve every board reachable from the empty board, for normal and
+    reverse play, and write the table to path
+    """
+    entries = array("H", [0] * (2 * NUM_BOARDS))
+    for offset, reverse in ((0, False), (NUM_BOARDS, True)):
+        solve(provided.TTTBoard(DIM, reverse), provided.PLAYERX, 0, entries, offset)
+    if sys.byteorder == "big":
+        entries.byteswap()
+    with open(path, "wb") as table_file:
+        entries.tofile(table_file)
+
+
+def load_table(path=TABLE_FILE):
+    """
+    Memory-map the table at path, building it first if it is missing
+    """
+    if not os.path.exists(path):
+        build_table(path)
+    with open(path, "rb") as table_file:
+        return mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def lookup(board, player):
+    """
+    Return the (score, best moves mask) entry of the board with player
+    to move, or None if the table does not hold it
+    """
+    global TABLE
+    if (board.get_height(), board.get_width(), board.get_win_length()) != (DIM, DIM, DIM):
+        return None
+    # the table only holds boards where PLAYERX moved first
+    if len(board.get_empty_squares()) % 2 != (1 if player == provided.PLAYERX else 0):
+        return None
+    if TABLE is None:
+        TABLE = load_table()
+    offset = NUM_BOARDS if board.get_reverse() else 0
+    entry = struct.unpack_from("<H", TABLE, 2 * (offset + board_code(board)))[0]
+    if not entry & SOLVED:
+        return None
+    return ((entry >> SCORE_SHIFT) & 3) - 1, entry & MOVES_MASK
+
+
+def table_move(board, player):
+    """
+    Make a move on the board.
+
+    Returns a tuple with two elements like mini-max, the score of the
+    board and the move as a tuple, (row, col). Boards missing from the
+    table are solved on the spot.
+    """
+    assert (board.get_height(), board.get_width(), board.get_win_length()) == (DIM, DIM, DIM), \
+        "the table only holds 3x3 boards"
+    entry = lookup(board, player)
+    if entry is None:
+        entries = array("H", [0] * NUM_BOARDS)
+        score = solve(board.clone(), player, board_code(board), entries, 0)
+        entry = (score, entries[board_code(board)] & MOVES_MASK)
+    score, moves = entry
+    if not moves:
+        return score, (-1, -1)
+    index = 0
+    while not moves & (1 << index):
+        index += 1
+    return score, (index // DIM, index % DIM)
+
+
+def move_wrapper(board, player, trials):
+    """
+    Wrapper to allow the use of the same infrastructure that was used
+    for Monte Carlo Tic-Tac-Toe.
+    """
+    move = table_move(board, player)
+    assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+    return move[1]
+
+
+# Test game with the console or the GUI.
+# Uncomment whichever you prefer.
+# Both should be commented out when you submit for
+# testing to save time.
+
+if __name__ == "__main__":
+    provided.play_game(move_wrapper, 1, False)
+    poc_ttt_gui.run_gui(3, provided.PLAYERO, move_wrapper, 1, False)
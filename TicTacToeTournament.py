@@ -0,0 +1,117 @@
+"""
+Headless tournament runner for Tic-Tac-Toe players
+"""
+
+import multiprocessing
+import random
+import time
+import poc_ttt_provided as provided
+
+# Latency percentiles reported for each player
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(values, pct):
+    """
+    Return the nearest-rank pct percentile of a list of values, or None
+    if the list is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered))), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def play_match_game(job):
+    """
+    Play one game between two move_wrapper-style players without any
+    output.
+
+    job is a (player_a, player_b, a_is_x, ntrials_a, ntrials_b, board,
+    seed) tuple, where board is the empty board to play on and seed
+    seeds the random module before the game.
+
+    Returns a (winner, latencies_a, latencies_b) tuple, where winner is
+    "a", "b" or None for a draw and the latencies are the seconds each
+    player took per move.
+    """
+    player_a, player_b, a_is_x, ntrials_a, ntrials_b, board, seed = job
+    random.seed(seed)
+    board = board.clone()
+    movers = {provided.PLAYERX: (player_a, ntrials_a, "a") if a_is_x else (player_b, ntrials_b, "b"),
+              provided.PLAYERO: (player_b, ntrials_b, "b") if a_is_x else (player_a, ntrials_a, "a")}
+    latencies = {"a": [], "b": []}
+    curplayer = provided.PLAYERX
+    winner = None
+    while winner is None:
+        function, ntrials, name = movers[curplayer]
+        start = time.time()
+        row, col = function(board, curplayer, ntrials)
+        latencies[name].append(time.time() - start)
+        board.move(row, col, curplayer)
+        winner = board.check_win()
+        curplayer = provided.switch_player(curplayer)
+    if winner == provided.DRAW:
+        return None, latencies["a"], latencies["b"]
+    return movers[winner][2], latencies["a"], latencies["b"]
+
+
+def run_tournament(player_a, player_b, games, ntrials, ntrials_b=None, board=None,
+                   reverse=False, processes=None, seed=0):
+    """
+    Play games games between player_a and player_b on a process pool,
+    alternating which player is PLAYERX.
+
+    player_a, player_b: move_wrapper-style functions (board, player,
+    trials), defined at module level so they can be sent to workers
+    ntrials: trials passed to player_a, and to player_b unless
+    ntrials_b is given
+    board: empty board to play on, a 3x3 TTTBoard by default
+    reverse: play reverse Tic-Tac-Toe on the default board
+    seed: game i seeds the random module with seed + i
+
+    Returns a dictionary with the wins, draws and losses of player_a
+    and the PERCENTILES of the move latencies of each player, in
+    seconds.
+    """
+    if ntrials_b is None:
+        ntrials_b = ntrials
+    if board is None:
+        board = provided.TTTBoard(3, reverse)
+    jobs = [(player_a, player_b, game % 2 == 0, ntrials, ntrials_b, board, seed + game)
+            for game in range(games)]
+    results = {"wins": 0, "draws": 0, "losses": 0}
+    latencies_a = []
+    latencies_b = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        for winner, game_latencies_a, game_latencies_b in pool.imap_unordered(play_match_game, jobs):
+            if winner == "a":
+                results["wins"] += 1
+            elif winner == "b":
+                results["losses"] += 1
+            else:
+                results["draws"] += 1
+            latencies_a.extend(game_latencies_a)
+            latencies_b.extend(game_latencies_b)
+    finally:
+        pool.close()
+        pool.join()
+    results["latency_a"] = dict([(pct, percentile(latencies_a, pct)) for pct in PERCENTILES])
+    results["latency_b"] = dict([(pct, percentile(latencies_b, pct)) for pct in PERCENTILES])
+    return results
+
+
+def run():
+    """
+    Pit the Monte Carlo player against alpha-beta mini-max
+    """
+    import TicTacToe
+    import TicTacToeMinimax
+    results = run_tournament(TicTacToe.mc_move, TicTacToeMinimax.ab_move_wrapper, 20, 1000)
+    print("Monte Carlo vs alpha-beta:", results)
+
+
+if __name__ == "__main__":
+    run()
@@ -3,7 +3,19 @@ Planner for Yahtzee
 Simplifications:  only allow discard and roll, only score against upper level
 """
 
+import collections
+import math
+import mmap
+import os
+import struct
 import poc_holds_testsuite
+import poc_yahtzee_testsuite
+
+# NumPy is only needed by the vectorized batch strategy
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Used to increase the timeout, if necessary
 try:
@@ -12,6 +24,32 @@ except:
     import SimpleGUICS2Pygame.codeskulptor as codeskulptor
 codeskulptor.set_timeout(50)
 
+# Expected values of recently used holds, keyed by (sorted held dice,
+# die sides, free dice), evicting the least recently used past
+# EV_CACHE_SIZE entries
+EV_CACHE_SIZE = 4096
+EV_CACHE = collections.OrderedDict()
+
+# Precomputed expected value tables, one file per (die sides, dice)
+# configuration: a header with EV_MAGIC, the die sides and the number of
+# dice, then one little-endian double per hold, holds ordered by length
+# and then as sorted tuples
+EV_MAGIC = b"YEV1"
+EV_HEADER = struct.Struct("<4sII")
+EV_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yahtzee_ev_%d_%d.bin")
+
+# Memory-mapped tables, keyed by (die sides, dice), as (mmap, hold
+# index) tuples
+EV_TABLES = {}
+
+# Values of the last reroll of a turn, keyed by (die sides, dice), as
+# dictionaries from each sorted hand to the expected score of its best
+# hold
+SECOND_STAGE = {}
+
+# Number of hands handled at once by batch_strategy
+BATCH_CHUNK = 65536
+
 
 def gen_all_sequences(outcomes, length):
     """
@@ -31,6 +69,45 @@ def gen_all_sequences(outcomes, length):
     return answer_set
 
 
+def gen_all_multisets(outcomes, length):
+    """
+    Iterative function that enumerates the set of all sorted sequences
+    of outcomes of given length, one for each multiset of outcomes.
+    """
+
+    answer_set = {()}
+    for dummy_idx in range(length):
+        temp_set = set()
+        for partial_sequence in answer_set:
+            for item in outcomes:
+                if not partial_sequence or item >= partial_sequence[-1]:
+                    new_sequence = list(partial_sequence)
+                    new_sequence.append(item)
+                    temp_set.add(tuple(new_sequence))
+        answer_set = temp_set
+    return answer_set
+
+
+def gen_weighted_rolls(num_die_sides, num_dice):
+    """
+    Enumerate the distinct rolls of num_dice dice, each with
+    num_die_sides, ignoring order.
+
+    Returns a list of (roll, weight) tuples, where roll is a sorted
+    tuple and weight is the number of ordered rolls that give it, the
+    multinomial coefficient num_dice! / (c1! c2! ...) of the counts of
+    each value.
+    """
+
+    rolls = []
+    for roll in sorted(gen_all_multisets(range(1, num_die_sides + 1), num_dice)):
+        weight = math.factorial(num_dice)
+        for value in set(roll):
+            weight //= math.factorial(roll.count(value))
+        rolls.append((roll, weight))
+    return rolls
+
+
 def score(hand):
     """
     Compute the maximal score for a Yahtzee hand according to the
@@ -41,11 +118,44 @@ def score(hand):
     Returns an integer score 
     """
 
+    return score_counts(hand_to_counts(hand))
+
+
+def hand_to_counts(hand):
+    """
+    Convert a hand to its count vector, a tuple whose entry value - 1
+    is the number of dice showing value, up to the highest die.
+
+    hand: yahtzee hand as a sequence of dice
+    """
+
+    counts = [0] * max(hand, default=0)
+    for die in hand:
+        counts[die - 1] += 1
+    return tuple(counts)
+
+
+def counts_to_hand(counts):
+    """
+    Convert a count vector back to a hand, as a sorted tuple of dice.
+    """
+
+    hand = []
+    for value, count in enumerate(counts):
+        hand.extend([value + 1] * count)
+    return tuple(hand)
+
+
+def score_counts(counts):
+    """
+    Compute the maximal upper section score of a hand given as a count
+    vector, in a single pass.
+    """
+
     max_value = 0
-    for num in hand:
-        value = hand.count(num) * num
-        if value > max_value:
-            max_value = value
+    for value, count in enumerate(counts):
+        if (value + 1) * count > max_value:
+            max_value = (value + 1) * count
     return max_value
 
 
@@ -62,13 +172,130 @@ def expected_value(held_dice, num_die_sides, num_free_dice):
     """
 
     total_score = 0.0
-    all_outcomes = gen_all_sequences(range(1, num_die_sides + 1), num_free_dice)
-    for roll in all_outcomes:
+    for roll, weight in gen_weighted_rolls(num_die_sides, num_free_dice):
         possible_hand = list(held_dice)
         for die in roll:
             possible_hand.append(die)
-        total_score += score(possible_hand)
-    return total_score / len(all_outcomes)
+        total_score += weight * score(possible_hand)
+    return total_score / num_die_sides ** num_free_dice
+
+
+def expected_value_gf(held_dice, num_die_sides, num_free_dice):
+    """
+    Compute the same expected value as expected_value with generating
+    functions, in time polynomial in the number of dice and sides.
+
+    The score is at most t exactly when each value v shows at most
+    t // v dice. For the free dice that is the coefficient of x^n in
+    n! / s^n * prod_v (sum_{k <= t // v - held_v} x^k / k!), with n
+    free dice of s sides, so the distribution of the score is found
+    threshold by threshold over the scores a hand can have.
+
+    held_dice: dice that you will hold
+    num_die_sides: number of sides on each die
+    num_free_dice: number of dice to be rolled
+
+    Returns a floating point expected value
+    """
+
+    held_counts = list(hand_to_counts(held_dice)) + [0] * num_die_sides
+    thresholds = set([0])
+    for value in range(1, num_die_sides + 1):
+        for count in range(held_counts[value - 1], held_counts[value - 1] + num_free_dice + 1):
+            thresholds.add(count * value)
+
+    total_score = 0.0
+    previous = 0.0
+    for threshold in sorted(thresholds):
+        # polynomial of the free dice that keep the score at most threshold
+        poly = [1.0] + [0.0] * num_free_dice
+        for value in range(1, num_die_sides + 1):
+            limit = min(threshold // value - held_counts[value - 1], num_free_dice)
+            if limit < 0:
+                poly = None
+                break
+            terms = [1.0]
+            for count in range(1, limit + 1):
+                terms.append(terms[-1] / (count * num_die_sides))
+            poly = [sum([poly[degree - count] * terms[count]
+                         for count in range(min(degree, limit) + 1)])
+                    for degree in range(num_free_dice + 1)]
+        probability = 0.0
+        if poly is not None:
+            probability = poly[num_free_dice] * math.factorial(num_free_dice)
+        total_score += threshold * (probability - previous)
+        previous = probability
+    return total_score
+
+
+def memo_expected_value(held_dice, num_die_sides, num_free_dice):
+    """
+    Compute the expected value of the held_dice like expected_value,
+    looking it up in a loaded table for the configuration or in the
+    cache of recently used holds first.
+    """
+
+    held_dice = tuple(sorted(held_dice))
+    table = EV_TABLES.get((num_die_sides, len(held_dice) + num_free_dice))
+    if table is not None:
+        values, index = table
+        return struct.unpack_from("<d", values, EV_HEADER.size + 8 * index[held_dice])[0]
+    key = (held_dice, num_die_sides, num_free_dice)
+    if key in EV_CACHE:
+        EV_CACHE.move_to_end(key)
+        return EV_CACHE[key]
+    value = expected_value(held_dice, num_die_sides, num_free_dice)
+    EV_CACHE[key] = value
+    if len(EV_CACHE) > EV_CACHE_SIZE:
+        EV_CACHE.popitem(last=False)
+    return value
+
+
+def gen_table_holds(num_die_sides, num_dice):
+    """
+    Return the list of every hold of at most num_dice dice, as sorted
+    tuples, in the order of the expected value table.
+    """
+
+    holds = []
+    for length in range(num_dice + 1):
+        holds.extend(sorted(gen_all_multisets(range(1, num_die_sides + 1), length)))
+    return holds
+
+
+def build_ev_table(num_die_sides, num_dice, path=None):
+    """
+    Compute the expected value of every hold of a hand of num_dice
+    dice, each with num_die_sides, and write the table to path.
+    """
+
+    if path is None:
+        path = EV_TABLE_FILE % (num_die_sides, num_dice)
+    with open(path, "wb") as table_file:
+        table_file.write(EV_HEADER.pack(EV_MAGIC, num_die_sides, num_dice))
+        for hold in gen_table_holds(num_die_sides, num_dice):
+            value = expected_value(hold, num_die_sides, num_dice - len(hold))
+            table_file.write(struct.pack("<d", value))
+
+
+def load_ev_table(num_die_sides, num_dice, path=None):
+    """
+    Memory-map the expected value table of the configuration at path,
+    building it first if it is missing, so that memo_expected_value
+    and strategy read their values from it.
+    """
+
+    if path is None:
+        path = EV_TABLE_FILE % (num_die_sides, num_dice)
+    if not os.path.exists(path):
+        build_ev_table(num_die_sides, num_dice, path)
+    with open(path, "rb") as table_file:
+        values = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = EV_HEADER.unpack_from(values, 0)
+    assert header == (EV_MAGIC, num_die_sides, num_dice), "table at " + path + " is for another configuration"
+    holds = gen_table_holds(num_die_sides, num_dice)
+    index = dict([(hold, position) for position, hold in enumerate(holds)])
+    EV_TABLES[(num_die_sides, num_dice)] = (values, index)
 
 
 def gen_all_holds(hand):
@@ -80,16 +307,32 @@ def gen_all_holds(hand):
     Returns a set of tuples, where each tuple is dice to hold
     """
 
-    all_sequences = {()}
-    for die in hand:
-        temp_set = set()
-        for partial_sequence in all_sequences:
-            new_sequence = list(partial_sequence)
-            new_sequence.append(die)
-            temp_set.add(tuple(new_sequence))
-        all_sequences = all_sequences.union(temp_set)
-    sorted_sequences = [tuple(sorted(sequence)) for sequence in all_sequences]
-    return set(sorted_sequences)
+    return set([counts_to_hand(counts) for counts in gen_all_hold_counts(hand_to_counts(hand))])
+
+
+def gen_all_hold_counts(counts):
+    """
+    Generate all possible choices of dice to hold from a hand given as
+    a count vector.
+
+    Every sub-count vector, holding between 0 and counts[i] dice of
+    each value, is produced exactly once by counting in the mixed radix
+    (counts[0] + 1, counts[1] + 1, ...), starting from holding nothing.
+
+    Returns a list of count vectors, as tuples.
+    """
+
+    hold = [0] * len(counts)
+    holds = [tuple(hold)]
+    while True:
+        position = 0
+        while position < len(counts) and hold[position] == counts[position]:
+            hold[position] = 0
+            position += 1
+        if position == len(counts):
+            return holds
+        hold[position] += 1
+        holds.append(tuple(hold))
 
 
 def strategy(hand, num_die_sides):
@@ -108,7 +351,129 @@ def strategy(hand, num_die_sides):
     hold_dice = ()
     all_holds = gen_all_holds(hand)
     for hold in all_holds:
-        value = expected_value(hold, num_die_sides, len(hand) - len(hold))
+        value = memo_expected_value(hold, num_die_sides, len(hand) - len(hold))
+        if value > expected_score:
+            expected_score = value
+            hold_dice = hold
+    return expected_score, hold_dice
+
+
+def encode_hold(hand, hold):
+    """
+    Return the bitmask of the positions of hand to hold, bit i standing
+    for hand[i], holding the first dice of each value in hand order.
+    """
+
+    remaining = list(hold)
+    mask = 0
+    for position, die in enumerate(hand):
+        if die in remaining:
+            remaining.remove(die)
+            mask |= 1 << position
+    return mask
+
+
+def batch_strategy(hands, num_die_sides, chunk_size=BATCH_CHUNK):
+    """
+    Compute strategy for many hands of the same number of dice.
+
+    Hands are reduced to their sorted form so each distinct hand is
+    solved once, and handled chunk_size rows at a time to bound memory.
+
+    hands: (N, dice) NumPy integer array, or a sequence of hands
+    num_die_sides: number of sides on each die
+
+    Returns a tuple of two arrays of length N, the expected scores and
+    the holds encoded as by encode_hold. Without NumPy, the arrays are
+    lists.
+    """
+
+    solved = {}
+    if numpy is None:
+        scores = []
+        holds = []
+        for hand in hands:
+            key = tuple(sorted(hand))
+            if key not in solved:
+                solved[key] = strategy(key, num_die_sides)
+            scores.append(solved[key][0])
+            holds.append(encode_hold(hand, solved[key][1]))
+        return scores, holds
+
+    hands = numpy.asarray(hands, dtype=numpy.int64)
+    num_hands, num_dice = hands.shape
+    scores = numpy.zeros(num_hands)
+    holds = numpy.zeros(num_hands, dtype=numpy.int64)
+    for start in range(0, num_hands, chunk_size):
+        chunk = hands[start:start + chunk_size]
+        # one base num_die_sides + 1 code per sorted hand
+        sorted_chunk = numpy.sort(chunk, axis=1)
+        codes = sorted_chunk.dot((num_die_sides + 1) ** numpy.arange(num_dice, dtype=numpy.int64))
+        dummy_codes, first, inverse = numpy.unique(codes, return_index=True, return_inverse=True)
+        unique = sorted_chunk[first]
+        inverse = inverse.reshape(-1)
+        unique_scores = numpy.zeros(len(unique))
+        hold_counts = numpy.zeros((len(unique), num_die_sides + 1), dtype=numpy.int64)
+        for index, row in enumerate(unique):
+            key = tuple(row.tolist())
+            if key not in solved:
+                solved[key] = strategy(key, num_die_sides)
+            unique_scores[index] = solved[key][0]
+            for die in solved[key][1]:
+                hold_counts[index, die] += 1
+        scores[start:start + len(chunk)] = unique_scores[inverse]
+
+        # die i is held if fewer dice of its value come before it than
+        # the hold keeps
+        chunk_holds = numpy.zeros(len(chunk), dtype=numpy.int64)
+        for position in range(num_dice):
+            earlier = (chunk[:, :position] == chunk[:, position:position + 1]).sum(axis=1)
+            held = earlier < hold_counts[inverse, chunk[:, position]]
+            chunk_holds |= held.astype(numpy.int64) << position
+        holds[start:start + len(chunk)] = chunk_holds
+    return scores, holds
+
+
+def get_second_stage(num_die_sides, num_dice):
+    """
+    Return the dictionary of the expected score of every sorted hand of
+    num_dice dice when the best hold is kept for the last reroll,
+    computing it on first use.
+    """
+
+    key = (num_die_sides, num_dice)
+    if key not in SECOND_STAGE:
+        values = {}
+        for hand, dummy_weight in gen_weighted_rolls(num_die_sides, num_dice):
+            values[hand] = strategy(hand, num_die_sides)[0]
+        SECOND_STAGE[key] = values
+    return SECOND_STAGE[key]
+
+
+def plan_turn(hand, num_die_sides):
+    """
+    Compute the first hold that maximizes the expected value of a turn
+    with two rerolls, when the best hold is kept for the second one.
+
+    Every outcome of the first reroll is valued from the second stage
+    table shared by all holds and all turns.
+
+    hand: full yahtzee hand
+    num_die_sides: number of sides on each die
+
+    Returns a tuple where the first element is the expected score and
+    the second element is a tuple of the dice to hold
+    """
+
+    second_stage = get_second_stage(num_die_sides, len(hand))
+    expected_score = 0.0
+    hold_dice = ()
+    for hold in gen_all_holds(hand):
+        num_free_dice = len(hand) - len(hold)
+        total_score = 0.0
+        for roll, weight in gen_weighted_rolls(num_die_sides, num_free_dice):
+            total_score += weight * second_stage[tuple(sorted(hold + roll))]
+        value = total_score / num_die_sides ** num_free_dice
         if value > expected_score:
             expected_score = value
             hold_dice = hold
@@ -123,7 +488,13 @@ def run_example():
     hand = (1, 1, 1, 5, 6)
     hand_score, hold = strategy(hand, num_die_sides)
     print("Best strategy for hand", hand, "is to hold", hold, "with expected score", hand_score)
+    hand_score, hold = plan_turn(hand, num_die_sides)
+    print("With two rerolls, the best first hold for hand", hand, "is", hold,
+          "with expected score", hand_score)
 
 
-run_example()
-poc_holds_testsuite.run_suite(gen_all_holds)
+if __name__ == "__main__":
+    run_example()
+    poc_holds_testsuite.run_suite(gen_all_holds)
+    poc_yahtzee_testsuite.run_suite(score, gen_all_holds, [expected_value, expected_value_gf, memo_expected_value],
+                                    strategy, plan_turn, batch_strategy)
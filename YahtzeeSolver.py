@@ -0,0 +1,438 @@
+"""
+Optimal solitaire Yahtzee solver
+Full game: three rolls per turn, thirteen categories, upper section
+bonus and Yahtzee bonuses
+"""
+
+import mmap
+import multiprocessing
+import os
+import struct
+from array import array
+import Yahtzee
+
+# NumPy is only needed to solve the game, queries on a solved table run
+# without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Categories, the upper section first
+ACES, TWOS, THREES, FOURS, FIVES, SIXES = range(6)
+THREE_OF_A_KIND = 6
+FOUR_OF_A_KIND = 7
+FULL_HOUSE = 8
+SMALL_STRAIGHT = 9
+LARGE_STRAIGHT = 10
+YAHTZEE = 11
+CHANCE = 12
+NUM_CATEGORIES = 13
+ALL_USED = (1 << NUM_CATEGORIES) - 1
+
+# Scoring values
+UPPER_GOAL = 63
+UPPER_BONUS = 35
+YAHTZEE_BONUS = 100
+FIXED_SCORES = {FULL_HOUSE: 25, SMALL_STRAIGHT: 30, LARGE_STRAIGHT: 40, YAHTZEE: 50}
+
+NUM_DIE_SIDES = 6
+NUM_DICE = 5
+
+# A state is the set of used categories as a bitmask, the upper section
+# subtotal capped at UPPER_GOAL and whether the Yahtzee box holds 50.
+# The table holds one little-endian double per state, the expected
+# score of the rest of the game, at index state_index(used, upper, flag).
+NUM_STATES = (ALL_USED + 1) * (UPPER_GOAL + 1) * 2
+SOLVER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yahtzee_solved.bin")
+
+# Masks of used categories solved together by a worker
+SOLVER_CHUNK = 16
+
+# Turn data shared by the solver and the queries, built on first use
+WIDGET = {}
+
+# Memory-mapped table of a solved game, opened on first query, and the
+# table each solver worker writes to
+TABLE = None
+WORKER_TABLE = None
+
+
+def state_index(used, upper, flag):
+    """
+    Return the index in the table of the state with the used
+    categories bitmask, upper section subtotal and Yahtzee bonus flag
+    """
+    return ((used << 6) | upper) << 1 | flag
+
+
+def category_score(category, roll):
+    """
+    Return the score of the sorted roll in the category, without
+    bonuses or Joker rules
+    """
+    counts = Yahtzee.hand_to_counts(roll)
+    faces = set(roll)
+    if category < 6:
+        return roll.count(category + 1) * (category + 1)
+    elif category == THREE_OF_A_KIND:
+        return sum(roll) if max(counts) >= 3 else 0
+    elif category == FOUR_OF_A_KIND:
+        return sum(roll) if max(counts) >= 4 else 0
+    elif category == FULL_HOUSE:
+        return 25 if sorted(count for count in counts if count) == [2, 3] else 0
+    elif category == SMALL_STRAIGHT:
+        for low in range(1, NUM_DIE_SIDES - 2):
+            if set(range(low, low + 4)) <= faces:
+                return 30
+        return 0
+    elif category == LARGE_STRAIGHT:
+        return 40 if len(faces) == 5 and max(roll) - min(roll) == 4 else 0
+    elif category == YAHTZEE:
+        return 50 if len(faces) == 1 else 0
+    return sum(roll)
+
+
+def get_widget():
+    """
+    Return the data of a turn, shared by every state, as a dictionary:
+
+    rolls: the distinct rolls of all dice, as sorted tuples
+    roll_probs: the probability of each roll
+    keeps: every hold, as sorted tuples, in Yahtzee.gen_table_holds order
+    keep_start, trans_roll, trans_prob: for keep k, the rolls reached by
+    rerolling the other dice are trans_roll[keep_start[k]:keep_start[k + 1]]
+    with probabilities trans_prob over the same range
+    roll_keep_start, roll_keeps: for roll r, the indices of the holds it
+    allows are roll_keeps[roll_keep_start[r]:roll_keep_start[r + 1]]
+    scores: scores[category * len(rolls) + r] is category_score
+    yahtzees: 1 for the rolls that are a Yahtzee, else 0
+    """
+    if not WIDGET:
+        weighted = Yahtzee.gen_weighted_rolls(NUM_DIE_SIDES, NUM_DICE)
+        rolls = [roll for roll, dummy_weight in weighted]
+        roll_index = dict([(roll, index) for index, roll in enumerate(rolls)])
+        keeps = Yahtzee.gen_table_holds(NUM_DIE_SIDES, NUM_DICE)
+        keep_index = dict([(keep, index) for index, keep in enumerate(keeps)])
+
+        keep_start = array("i", [0])
+        trans_roll = array("i")
+        trans_prob = array("d")
+        for keep in keeps:
+            free_dice = NUM_DICE - len(keep)
+            for outcome, weight in Yahtzee.gen_weighted_rolls(NUM_DIE_SIDES, free_dice):
+                trans_roll.append(roll_index[tuple(sorted(keep + outcome))])
+                trans_prob.append(float(weight) / NUM_DIE_SIDES ** free_dice)
+            keep_start.append(len(trans_roll))
+
+        roll_keep_start = array("i", [0])
+        roll_keeps = array("i")
+        for roll in rolls:
+            roll_keeps.extend(sorted(keep_index[keep] for keep in Yahtzee.gen_all_holds(roll)))
+            roll_keep_start.append(len(roll_keeps))
+
+        WIDGET["rolls"] = rolls
+        WIDGET["roll_probs"] = array("d", [float(weight) / NUM_DIE_SIDES ** NUM_DICE
+                                           for dummy_roll, weight in weighted])
+        WIDGET["keeps"] = keeps
+        WIDGET["keep_start"] = keep_start
+        WIDGET["trans_roll"] = trans_roll
+        WIDGET["trans_prob"] = trans_prob
+        WIDGET["roll_keep_start"] = roll_keep_start
+        WIDGET["roll_keeps"] = roll_keeps
+        WIDGET["scores"] = array("i", [category_score(category, roll)
+                                       for category in range(NUM_CATEGORIES) for roll in rolls])
+        WIDGET["yahtzees"] = array("b", [1 if len(set(roll)) == 1 else 0 for roll in rolls])
+    return WIDGET
+
+
+def gen_upper_subtotals(used):
+    """
+    Return the sorted list of upper section subtotals, capped at
+    UPPER_GOAL, that can be reached with the used categories
+    """
+    subtotals = {0}
+    for category in range(6):
+        if used & (1 << category):
+            subtotals = set([min(UPPER_GOAL, subtotal + count * (category + 1))
+                             for subtotal in subtotals for count in range(NUM_DICE + 1)])
+    return sorted(subtotals)
+
+
+def gen_states(used):
+    """
+    Return the list of reachable (used, upper, flag) states with the
+    used categories
+    """
+    flags = (0, 1) if used & (1 << YAHTZEE) else (0,)
+    return [(used, upper, flag) for upper in gen_upper_subtotals(used) for flag in flags]
+
+
+def move_outcome(category, roll, used, upper, flag):
+    """
+    Return a (points, next state index) tuple for scoring the roll,
+    given by index, in the unused category from the state.
+
+    A Yahtzee rolled once the Yahtzee box is used earns YAHTZEE_BONUS
+    if the box holds 50, and acts as a Joker scoring full value in the
+    full house and straights, whichever box is chosen.
+    """
+    widget = get_widget()
+    num_rolls = len(widget["rolls"])
+    points = widget["scores"][category * num_rolls + roll]
+    yahtzee = widget["yahtzees"][roll]
+    if yahtzee and used & (1 << YAHTZEE):
+        points += YAHTZEE_BONUS * flag
+        if category in (FULL_HOUSE, SMALL_STRAIGHT, LARGE_STRAIGHT):
+            points = FIXED_SCORES[category] + YAHTZEE_BONUS * flag
+    if category < 6:
+        new_upper = min(UPPER_GOAL, upper + widget["scores"][category * num_rolls + roll])
+        if upper < UPPER_GOAL <= new_upper:
+            points += UPPER_BONUS
+        upper = new_upper
+    elif category == YAHTZEE:
+        flag = yahtzee
+    return points, state_index(used | (1 << category), upper, flag)
+
+
+def get_dense_widget():
+    """
+    Return the turn data as NumPy arrays for the solver: the dense keep
+    to roll transition matrix and, for each roll, the indices of the
+    holds it allows padded with repeats to equal length
+    """
+    widget = get_widget()
+    if "transitions" not in widget:
+        num_rolls = len(widget["rolls"])
+        num_keeps = len(widget["keeps"])
+        keep_start = numpy.frombuffer(widget["keep_start"], dtype=numpy.int32)
+        keep_rows = numpy.repeat(numpy.arange(num_keeps), numpy.diff(keep_start))
+        transitions = numpy.zeros((num_keeps, num_rolls))
+        numpy.add.at(transitions, (keep_rows, numpy.frombuffer(widget["trans_roll"], dtype=numpy.int32)),
+                     numpy.frombuffer(widget["trans_prob"], dtype=numpy.float64))
+        roll_keep_start = widget["roll_keep_start"]
+        width = max([roll_keep_start[roll + 1] - roll_keep_start[roll] for roll in range(num_rolls)])
+        padded_keeps = numpy.zeros((num_rolls, width), dtype=numpy.int64)
+        for roll in range(num_rolls):
+            allowed = widget["roll_keeps"][roll_keep_start[roll]:roll_keep_start[roll + 1]]
+            padded_keeps[roll, :] = allowed[0]
+            padded_keeps[roll, :len(allowed)] = allowed
+        widget["transitions"] = transitions
+        widget["padded_keeps"] = padded_keeps
+    return widget
+
+
+def solve_states(states, values):
+    """
+    Return the expected score of the rest of the game from each state,
+    given the values of every state with more used categories, with
+    NumPy across all the states at once.
+
+    values: NumPy array or memmap indexed by state_index
+    """
+    widget = get_dense_widget()
+    num_rolls = len(widget["rolls"])
+    used = numpy.array([state[0] for state in states], dtype=numpy.int64)
+    upper = numpy.array([state[1] for state in states], dtype=numpy.int64)
+    flag = numpy.array([state[2] for state in states], dtype=numpy.int64)
+    scores = numpy.frombuffer(widget["scores"], dtype=numpy.int32).reshape(NUM_CATEGORIES, num_rolls)
+    yahtzees = numpy.frombuffer(widget["yahtzees"], dtype=numpy.int8).astype(numpy.int64)[:, None]
+
+    # value of each final roll, choosing the best unused category, the
+    # same computation as move_outcome for all rolls and states
+    final = numpy.full((num_rolls, len(states)), -numpy.inf)
+    for category in range(NUM_CATEGORIES):
+        free = numpy.nonzero((used >> category) & 1 == 0)[0]
+        if len(free) == 0:
+            continue
+        cat_used = used[free][None, :]
+        cat_upper = upper[free][None, :]
+        cat_flag = flag[free][None, :]
+        joker = yahtzees * ((cat_used >> YAHTZEE) & 1)
+        points = scores[category][:, None] + YAHTZEE_BONUS * joker * cat_flag
+        if category in (FULL_HOUSE, SMALL_STRAIGHT, LARGE_STRAIGHT):
+            points = numpy.where(joker == 1, FIXED_SCORES[category] + YAHTZEE_BONUS * cat_flag, points)
+        next_upper = cat_upper
+        next_flag = cat_flag
+        if category < 6:
+            next_upper = numpy.minimum(UPPER_GOAL, cat_upper + scores[category][:, None])
+            points = points + UPPER_BONUS * ((cat_upper < UPPER_GOAL) & (next_upper >= UPPER_GOAL))
+        elif category == YAHTZEE:
+            next_flag = yahtzees + 0 * cat_flag
+        next_index = (((cat_used | (1 << category)) << 6 | next_upper) << 1) | next_flag
+        final[:, free] = numpy.maximum(final[:, free], points + values[next_index])
+
+    # two rerolls, each keeping the best hold of the roll
+    current = final
+    padded_keeps = widget["padded_keeps"]
+    for dummy_reroll in range(2):
+        keep_values = widget["transitions"].dot(current)
+        current = keep_values[padded_keeps[:, 0]]
+        for column in range(1, padded_keeps.shape[1]):
+            numpy.maximum(current, keep_values[padded_keeps[:, column]], out=current)
+    return numpy.frombuffer(widget["roll_probs"], dtype=numpy.float64).dot(current)
+
+
+def init_solver_worker(path):
+    """
+    Open the table being solved at path in a worker process
+    """
+    global WORKER_TABLE
+    WORKER_TABLE = numpy.memmap(path, dtype="<f8", mode="r+", shape=(NUM_STATES,))
+
+
+def solve_chunk(masks):
+    """
+    Solve the states of the used category masks into the worker table
+    and return the number of states solved
+    """
+    states = []
+    for used in masks:
+        states.extend(gen_states(used))
+    indices = numpy.array([state_index(*state) for state in states], dtype=numpy.int64)
+    WORKER_TABLE[indices] = solve_states(states, WORKER_TABLE)
+    WORKER_TABLE.flush()
+    return len(states)
+
+
+def solve(path=SOLVER_FILE, processes=None):
+    """
+    Solve the game by backward induction and write the table to path.
+
+    States are solved in layers by the number of used categories, from
+    twelve down to none. Each layer is split into chunks of
+    SOLVER_CHUNK masks across a pool of processes, which read the
+    finished layers from the memory-mapped table and write their
+    results to it. States where every category is used stay 0.
+
+    Returns the expected score of a game played optimally.
+    """
+    global TABLE
+    assert numpy is not None, "solving the game needs NumPy"
+    get_dense_widget()
+    with open(path, "wb") as table_file:
+        table_file.truncate(NUM_STATES * 8)
+    pool = multiprocessing.Pool(processes, init_solver_worker, (path,))
+    try:
+        for layer in range(NUM_CATEGORIES - 1, -1, -1):
+            masks = [used for used in range(ALL_USED + 1) if bin(used).count("1") == layer]
+            chunks = [masks[start:start + SOLVER_CHUNK] for start in range(0, len(masks), SOLVER_CHUNK)]
+            pool.map(solve_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    TABLE = None
+    return state_value(0, 0, 0, path)
+
+
+def load_table(path=SOLVER_FILE):
+    """
+    Memory-map the solved table at path, solving the game first if it
+    is missing
+    """
+    if not os.path.exists(path):
+        solve(path)
+    with open(path, "rb") as table_file:
+        return mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def state_value(used, upper, flag, path=SOLVER_FILE):
+    """
+    Return the expected score of the rest of the game from the state,
+    opening the table at path on first use
+    """
+    global TABLE
+    if TABLE is None:
+        TABLE = load_table(path)
+    return struct.unpack_from("<d", TABLE, 8 * state_index(used, upper, flag))[0]
+
+
+def turn_values(used, upper, flag):
+    """
+    Return the values of a turn from the state, as a (roll_values,
+    keep_values) tuple of lists indexed by the rerolls left.
+
+    roll_values[rerolls][r] is the expected score of the rest of the
+    game after rolling roll r with rerolls rerolls left, and
+    keep_values[rerolls][k] that of holding keep k before rerolling
+    with rerolls left, for rerolls from 1.
+    """
+    widget = get_widget()
+    num_rolls = len(widget["rolls"])
+    final = []
+    for roll in range(num_rolls):
+        best = None
+        for category in range(NUM_CATEGORIES):
+            if not used & (1 << category):
+                points, next_index = move_outcome(category, roll, used, upper, flag)
+                value = points + struct.unpack_from("<d", TABLE, 8 * next_index)[0]
+                if best is None or value > best:
+                    best = value
+        final.append(best)
+    roll_values = [final]
+    keep_values = [None]
+    keep_start = widget["keep_start"]
+    roll_keep_start = widget["roll_keep_start"]
+    for dummy_reroll in range(2):
+        current = roll_values[-1]
+        keeps = []
+        for keep in range(len(widget["keeps"])):
+            total = 0.0
+            for position in range(keep_start[keep], keep_start[keep + 1]):
+                total += widget["trans_prob"][position] * current[widget["trans_roll"][position]]
+            keeps.append(total)
+        keep_values.append(keeps)
+        roll_values.append([max([keeps[keep] for keep in
+                                 widget["roll_keeps"][roll_keep_start[roll]:roll_keep_start[roll + 1]]])
+                            for roll in range(num_rolls)])
+    return roll_values, keep_values
+
+
+def best_move(hand, rerolls, used=0, upper=0, flag=0):
+    """
+    Compute the optimal play for a hand of the full game.
+
+    hand: the five dice rolled
+    rerolls: number of rerolls left in the turn, 0 to 2
+    used, upper, flag: the state, see state_index
+
+    With rerolls left, returns a tuple where the first element is the
+    expected score of the rest of the game and the second element is a
+    tuple of the dice to hold, like Yahtzee.strategy. With none left,
+    the second element is the category to score the hand in.
+    """
+    if TABLE is None:
+        state_value(used, upper, flag)
+    widget = get_widget()
+    roll = widget["rolls"].index(tuple(sorted(hand)))
+    if rerolls == 0:
+        best = None
+        for category in range(NUM_CATEGORIES):
+            if not used & (1 << category):
+                points, next_index = move_outcome(category, roll, used, upper, flag)
+                value = points + struct.unpack_from("<d", TABLE, 8 * next_index)[0]
+                if best is None or value > best[0]:
+                    best = (value, category)
+        return best
+    dummy_rolls, keep_values = turn_values(used, upper, flag)
+    roll_keep_start = widget["roll_keep_start"]
+    best = None
+    for keep in widget["roll_keeps"][roll_keep_start[roll]:roll_keep_start[roll + 1]]:
+        if best is None or keep_values[rerolls][keep] > best[0]:
+            best = (keep_values[rerolls][keep], widget["keeps"][keep])
+    return best
+
+
+def run_example():
+    """
+    Solve the game and show the optimal opening hold for an example
+    hand
+    """
+    print("Expected score of optimal play:", state_value(0, 0, 0))
+    hand = (1, 1, 1, 5, 6)
+    value, hold = best_move(hand, 2)
+    print("Best first hold for hand", hand, "is", hold, "with expected score", value)
+
+
+if __name__ == "__main__":
+    run_example()
@@ -2,10 +2,16 @@
 Student portion of Zombie Apocalypse mini-project
 """
 
+import json
+import multiprocessing
+import os
 import random
+import zlib
+from collections import OrderedDict
 import poc_grid
 import poc_queue
 import poc_zombie_gui
+import poc_zombie_testsuite
 
 # global constants
 EMPTY = 0
@@ -15,6 +21,84 @@ EIGHT_WAY = 1
 OBSTACLE = "obstacle"
 HUMAN = "human"
 ZOMBIE = "zombie"
+DISTANCE_CACHE_SIZE = 8
+
+# Default values for the keys of a batch scenario specification
+SCENARIO_DEFAULTS = {"height": 30,
+                     "width": 40,
+                     "obstacle_density": 0.2,
+                     "num_zombies": 5,
+                     "num_humans": 20,
+                     "steps": 100,
+                     "radius": None,
+                     "seed": None}
+
+
+class SparseDistanceField:
+    """
+    Distance field that only stores cells within a radius of the
+    sources, every other cell reads as a saturated "far away" value
+    """
+
+    def __init__(self, far_distance):
+        """
+        Create an empty field where every cell is far away
+        """
+        self._far_distance = far_distance
+        self._rows = {}
+
+    def __getitem__(self, row):
+        """
+        Return the row of the field, indexed by column
+        """
+        if row in self._rows:
+            return self._rows[row]
+        return SparseRow(self._far_distance)
+
+    def __contains__(self, cell):
+        """
+        Checks whether the distance of the cell is stored
+        """
+        return cell[0] in self._rows and cell[1] in self._rows[cell[0]]
+
+    def __len__(self):
+        """
+        Return the number of stored cells
+        """
+        return sum([len(row) for row in self._rows.values()])
+
+    def get_far_distance(self):
+        """
+        Return the distance read for cells outside the radius
+        """
+        return self._far_distance
+
+    def set_distance(self, row, col, distance):
+        """
+        Store the distance of cell (row, col)
+        """
+        if row not in self._rows:
+            self._rows[row] = SparseRow(self._far_distance)
+        self._rows[row][col] = distance
+
+
+class SparseRow(dict):
+    """
+    Row of a sparse distance field, missing columns are far away
+    """
+
+    def __init__(self, far_distance):
+        """
+        Create an empty row
+        """
+        dict.__init__(self)
+        self._far_distance = far_distance
+
+    def __missing__(self, col):
+        """
+        Return the far away distance for cells that are not stored
+        """
+        return self._far_distance
 
 
 class Zombie(poc_grid.Grid):
@@ -24,15 +108,25 @@ class Zombie(poc_grid.Grid):
     """
 
     def __init__(self, grid_height, grid_width, obstacle_list=None,
-                 zombie_list=None, human_list=None):
+                 zombie_list=None, human_list=None, rng=None):
         """
         Create a simulation of given size with given obstacles,
         humans, and zombies
+
+        rng is the random.Random used to break ties between moves,
+        the global random module is used if it is None
         """
         poc_grid.Grid.__init__(self, grid_height, grid_width)
         if obstacle_list is not None:
             for cell in obstacle_list:
-                self.set_full(cell[0], cell[1])
+                poc_grid.Grid.set_full(self, cell[0], cell[1])
+        self._label_components()
+        self._version = 0
+        self._distance_cache = OrderedDict()
+        if rng is not None:
+            self._rng = rng
+        else:
+            self._rng = random
         if zombie_list is not None:
             self._zombie_list = list(zombie_list)
         else:
@@ -48,9 +142,220 @@ class Zombie(poc_grid.Grid):
         Reset zombie and human lists to be empty
         """
         poc_grid.Grid.clear(self)
+        self._label_components()
+        self._version += 1
         self._zombie_list = []
         self._human_list = []
 
+    def set_empty(self, row, col):
+        """
+        Set cell to be empty, merging the components of its empty
+        neighbors into a single component
+        """
+        if self.is_empty(row, col):
+            return
+        poc_grid.Grid.set_empty(self, row, col)
+        self._version += 1
+        labels = []
+        for neighbor in self.four_neighbors(row, col):
+            label = self._components[neighbor[0]][neighbor[1]]
+            if label is not None and label not in labels:
+                labels.append(label)
+        if not labels:
+            label = self._new_component()
+        else:
+            # keep the largest component label and relabel the others
+            label = max(labels, key=lambda item: self._component_sizes[item])
+            for other in labels:
+                if other != label:
+                    for neighbor in self.four_neighbors(row, col):
+                        if self._components[neighbor[0]][neighbor[1]] == other:
+                            self._relabel_component(neighbor, label)
+                            break
+        self._components[row][col] = label
+        self._component_sizes[label] += 1
+
+    def set_full(self, row, col):
+        """
+        Set cell to be full, splitting its component if the new
+        obstacle disconnects it
+        """
+        if not self.is_empty(row, col):
+            return
+        poc_grid.Grid.set_full(self, row, col)
+        self._version += 1
+        label = self._components[row][col]
+        self._components[row][col] = None
+        self._component_sizes[label] -= 1
+        if self._component_sizes[label] == 0:
+            del self._component_sizes[label]
+            return
+        neighbors = [neighbor for neighbor in self.four_neighbors(row, col)
+                     if self._components[neighbor[0]][neighbor[1]] == label]
+        if len(neighbors) > 1:
+            self._split_component(label, neighbors)
+
+    def _split_component(self, label, starts):
+        """
+        Give new labels to the parts of component label that are no
+        longer connected to each other, starts being cells next to the
+        new obstacle
+
+        One search runs from each start, taking turns one cell at a
+        time. Searches that meet are merged, and a search that runs out
+        of cells before meeting the others has found a separate part,
+        which is relabeled. Once a single search is left, the rest of
+        the component keeps its label, so the cost is bounded by the
+        size of the smaller parts rather than the whole component.
+        """
+        parents = list(range(len(starts)))
+        owners = {}
+        cells = []
+        boundaries = []
+        for idx, start in enumerate(starts):
+            owners[start] = idx
+            cells.append([start])
+            boundaries.append([start])
+        active = list(range(len(starts)))
+        while len(active) > 1:
+            for search in list(active):
+                if len(active) == 1:
+                    break
+                if search not in active:
+                    continue
+                if not boundaries[search]:
+                    new_label = self._new_component()
+                    for cell in cells[search]:
+                        self._components[cell[0]][cell[1]] = new_label
+                    self._component_sizes[new_label] = len(cells[search])
+                    self._component_sizes[label] -= len(cells[search])
+                    active.remove(search)
+                    continue
+                cell = boundaries[search].pop()
+                for neighbor in self.four_neighbors(cell[0], cell[1]):
+                    if self._components[neighbor[0]][neighbor[1]] != label:
+                        continue
+                    if neighbor not in owners:
+                        owners[neighbor] = search
+                        cells[search].append(neighbor)
+                        boundaries[search].append(neighbor)
+                        continue
+                    other = self._find_search(parents, owners[neighbor])
+                    if other != search:
+                        # merge the smaller search into the larger one
+                        if len(cells[other]) > len(cells[search]):
+                            search, other = other, search
+                        parents[other] = search
+                        cells[search].extend(cells[other])
+                        boundaries[search].extend(boundaries[other])
+                        active.remove(other)
+
+    @staticmethod
+    def _find_search(parents, search):
+        """
+        Return the search that search was merged into
+        """
+        while parents[search] != search:
+            search = parents[search]
+        return search
+
+    def _label_components(self):
+        """
+        Label the connected components of empty cells in one pass over
+        the grid
+        """
+        self._components = [[None for dummy_col in range(self._grid_width)]
+                            for dummy_row in range(self._grid_height)]
+        self._component_sizes = {}
+        self._next_label = 0
+        for row in range(self._grid_height):
+            for col in range(self._grid_width):
+                if self.is_empty(row, col) and self._components[row][col] is None:
+                    label = self._new_component()
+                    self._components[row][col] = label
+                    boundary = [(row, col)]
+                    while boundary:
+                        cell = boundary.pop()
+                        self._component_sizes[label] += 1
+                        for neighbor in self.four_neighbors(cell[0], cell[1]):
+                            if (self.is_empty(neighbor[0], neighbor[1])
+                                    and self._components[neighbor[0]][neighbor[1]] is None):
+                                self._components[neighbor[0]][neighbor[1]] = label
+                                boundary.append(neighbor)
+
+    def _new_component(self):
+        """
+        Return the label of a new, empty component
+        """
+        label = self._next_label
+        self._next_label += 1
+        self._component_sizes[label] = 0
+        return label
+
+    def _flood_component(self, start, new_label=None):
+        """
+        Return the set of cells in the component containing start,
+        relabeling them with new_label if given
+        """
+        label = self._components[start[0]][start[1]]
+        reached = {start}
+        boundary = [start]
+        while boundary:
+            cell = boundary.pop()
+            if new_label is not None:
+                self._components[cell[0]][cell[1]] = new_label
+            for neighbor in self.four_neighbors(cell[0], cell[1]):
+                if neighbor not in reached and self._components[neighbor[0]][neighbor[1]] == label:
+                    reached.add(neighbor)
+                    boundary.append(neighbor)
+        if new_label is not None:
+            self._component_sizes[new_label] += len(reached)
+        return reached
+
+    def _relabel_component(self, start, label):
+        """
+        Merge the component containing start into component label
+        """
+        old_label = self._components[start[0]][start[1]]
+        self._flood_component(start, label)
+        del self._component_sizes[old_label]
+
+    def get_component(self, row, col):
+        """
+        Return the label of the connected component of empty cells
+        containing (row, col), or None if the cell is full
+        """
+        return self._components[row][col]
+
+    def _source_components(self, source_list):
+        """
+        Return the set of components that a distance field started
+        from source_list can reach
+        """
+        labels = set()
+        for cell in source_list:
+            if self.is_empty(cell[0], cell[1]):
+                labels.add(self._components[cell[0]][cell[1]])
+            else:
+                for neighbor in self.four_neighbors(cell[0], cell[1]):
+                    if self.is_empty(neighbor[0], neighbor[1]):
+                        labels.add(self._components[neighbor[0]][neighbor[1]])
+        return labels
+
+    def _is_isolated(self, agent, target_components):
+        """
+        Checks whether an agent stands in a component that holds no
+        targets, in which case it has nowhere useful to move
+        """
+        label = self._components[agent[0]][agent[1]]
+        return label is not None and label not in target_components
+
+    def get_version(self):
+        """
+        Return a counter that changes whenever the obstacles change
+        """
+        return self._version
+
     def add_zombie(self, row, col):
         """
         Add zombie to the zombie list
@@ -90,26 +395,68 @@ class Zombie(poc_grid.Grid):
         for human in self._human_list:
             yield human
 
-    def compute_distance_field(self, entity_type):
+    def capture_humans(self):
+        """
+        Remove the humans that share a cell with a zombie
+        Returns the number of humans captured
+        """
+        zombie_cells = set(self._zombie_list)
+        survivors = [human for human in self._human_list if human not in zombie_cells]
+        captured = len(self._human_list) - len(survivors)
+        self._human_list = survivors
+        return captured
+
+    def compute_distance_field(self, entity_type, radius=None):
         """
         Function computes a 2D distance field
         Distance at member of entity_queue is zero
         Shortest paths avoid obstacles and use distance_type distances
+        Components that contain no source keep the sentinel distance
+
+        If radius is given, only the cells near the sources are
+        computed and every other cell reads as a far away value greater
+        than any computed distance. Every agent within radius of a
+        source moves exactly as with the full field: zombies need their
+        neighbors to radius + 1, humans, moving diagonally, to radius + 2
+        and also the diagonal neighbors cut off by obstacles, which the
+        search keeps going for.
+
+        Fields are cached by obstacle version and source cells, so the
+        returned field is shared and must not be modified
+        """
+        if entity_type == HUMAN:
+            source_list = self._human_list
+        else:
+            source_list = self._zombie_list
+        key = (self._version, entity_type, radius, frozenset(source_list))
+        if key in self._distance_cache:
+            self._distance_cache.move_to_end(key)
+            return self._distance_cache[key]
+        if radius is not None:
+            # the zombie field is read by humans, who move diagonally
+            distance_field = self._compute_local_distance_field(source_list, radius, entity_type == ZOMBIE)
+        else:
+            distance_field = self._compute_full_distance_field(source_list)
+        self._distance_cache[key] = distance_field
+        if len(self._distance_cache) > DISTANCE_CACHE_SIZE:
+            self._distance_cache.popitem(last=False)
+        return distance_field
+
+    def _compute_full_distance_field(self, source_list):
+        """
+        Breadth first search from the sources over the whole grid
         """
-        visited = poc_grid.Grid(self._grid_height, self._grid_width)
         distance_field = [[self._grid_height * self._grid_width for dummy_col in range(self._grid_width)]
                           for dummy_row in range(self._grid_height)]
+        if not self._source_components(source_list):
+            # no empty cell is reachable from any source
+            return distance_field
+        visited = poc_grid.Grid(self._grid_height, self._grid_width)
         boundary = poc_queue.Queue()
-        if entity_type == HUMAN:
-            for cell in self._human_list:
-                boundary.enqueue(cell)
-                visited.set_full(cell[0], cell[1])
-                distance_field[cell[0]][cell[1]] = 0
-        else:
-            for cell in self._zombie_list:
-                boundary.enqueue(cell)
-                visited.set_full(cell[0], cell[1])
-                distance_field[cell[0]][cell[1]] = 0
+        for cell in source_list:
+            boundary.enqueue(cell)
+            visited.set_full(cell[0], cell[1])
+            distance_field[cell[0]][cell[1]] = 0
         while len(boundary) > 0:
             cell = boundary.dequeue()
             neighbors = self.four_neighbors(cell[0], cell[1])
@@ -122,13 +469,75 @@ class Zombie(poc_grid.Grid):
                                                                    distance + 1)
         return distance_field
 
+    def _compute_local_distance_field(self, source_list, radius, diagonal):
+        """
+        Breadth first search from the sources that stops past radius,
+        storing the visited cells in a sparse field
+
+        The search covers radius + 1, or radius + 2 if diagonal, then
+        goes on until every diagonal neighbor of a cell within radius
+        whose two connecting cells are full is reached, or nothing is
+        left to reach. Such neighbors in components the sources cannot
+        reach are skipped, they read as far in any field.
+        """
+        depth = radius + 2 if diagonal else radius + 1
+        distances = {}
+        components = self._source_components(source_list)
+        if components:
+            boundary = poc_queue.Queue()
+            for cell in source_list:
+                if cell not in distances:
+                    boundary.enqueue(cell)
+                    distances[cell] = 0
+            pending = None
+            while len(boundary) > 0:
+                cell = boundary.dequeue()
+                distance = distances[cell]
+                if distance == depth and pending is None:
+                    pending = set()
+                    if diagonal:
+                        for near in list(distances):
+                            if distances[near] <= radius:
+                                pending.update(self._cut_diagonals(near, distances, components))
+                if pending is not None:
+                    pending.discard(cell)
+                    if not pending:
+                        break
+                for neighbor in self.four_neighbors(cell[0], cell[1]):
+                    if self.is_empty(neighbor[0], neighbor[1]) and neighbor not in distances:
+                        boundary.enqueue(neighbor)
+                        distances[neighbor] = distance + 1
+        distance_field = SparseDistanceField(max(list(distances.values()) + [depth]) + 1)
+        for cell, distance in distances.items():
+            distance_field.set_distance(cell[0], cell[1], distance)
+        return distance_field
+
+    def _cut_diagonals(self, cell, distances, components):
+        """
+        Return the empty diagonal neighbors of cell in components and
+        missing from distances whose two cells connecting them to cell
+        are full
+        """
+        cut = []
+        for neighbor in self.eight_neighbors(cell[0], cell[1]):
+            if (neighbor[0] != cell[0] and neighbor[1] != cell[1] and neighbor not in distances
+                    and self.is_empty(neighbor[0], neighbor[1])
+                    and self._components[neighbor[0]][neighbor[1]] in components
+                    and not self.is_empty(cell[0], neighbor[1])
+                    and not self.is_empty(neighbor[0], cell[1])):
+                cut.append(neighbor)
+        return cut
+
     def move_humans(self, zombie_distance):
         """
         Function that moves humans away from zombies, diagonal moves
         are allowed
         """
+        target_components = self._source_components(self._zombie_list)
         for idx in range(self.num_humans()):
             human = self._human_list[idx]
+            if self._is_isolated(human, target_components):
+                continue
             neighbors = self.eight_neighbors(human[0], human[1])
             distance = zombie_distance[human[0]][human[1]]
             moves = [human]
@@ -140,15 +549,18 @@ class Zombie(poc_grid.Grid):
                         moves = [neighbor]
                     elif neighbor_distance == distance:
                         moves.append(neighbor)
-            self._human_list[idx] = moves[random.randint(0, len(moves) - 1)]
+            self._human_list[idx] = moves[self._rng.randint(0, len(moves) - 1)]
 
     def move_zombies(self, human_distance):
         """
         Function that moves zombies towards humans, no diagonal moves
         are allowed
         """
+        target_components = self._source_components(self._human_list)
         for idx in range(self.num_zombies()):
             zombie = self._zombie_list[idx]
+            if self._is_isolated(zombie, target_components):
+                continue
             neighbors = self.four_neighbors(zombie[0], zombie[1])
             distance = human_distance[zombie[0]][zombie[1]]
             moves = [zombie]
@@ -160,10 +572,164 @@ class Zombie(poc_grid.Grid):
                         moves = [neighbor]
                     elif neighbor_distance == distance:
                         moves.append(neighbor)
-            self._zombie_list[idx] = moves[random.randint(0, len(moves) - 1)]
+            self._zombie_list[idx] = moves[self._rng.randint(0, len(moves) - 1)]
+
+
+def scenario_seed(spec):
+    """
+    Return spec["seed"], or if it is missing or None a seed derived from
+    spec["id"], so scenarios of a batch get distinct random streams that
+    are the same on every run
+    """
+    if spec.get("seed") is not None:
+        return spec["seed"]
+    return zlib.crc32(repr(spec.get("id")).encode("utf-8"))
+
+
+def make_scenario(spec):
+    """
+    Build the simulation described by a scenario specification
+
+    spec: dictionary with any of the keys of SCENARIO_DEFAULTS
+
+    Obstacles and agents are placed with a random.Random seeded by
+    scenario_seed(spec), which the simulation then uses for its moves
+    """
+    rng = random.Random(scenario_seed(spec))
+    spec = dict(SCENARIO_DEFAULTS, **spec)
+    height = spec["height"]
+    width = spec["width"]
+    obstacle_list = [(row, col) for row in range(height) for col in range(width)
+                     if rng.random() < spec["obstacle_density"]]
+    obstacles = set(obstacle_list)
+    empty_cells = [(row, col) for row in range(height) for col in range(width)
+                   if (row, col) not in obstacles]
+    if not empty_cells:
+        return Zombie(height, width, obstacle_list, rng=rng)
+    zombie_list = [rng.choice(empty_cells) for dummy_idx in range(spec["num_zombies"])]
+    human_list = [rng.choice(empty_cells) for dummy_idx in range(spec["num_humans"])]
+    return Zombie(height, width, obstacle_list, zombie_list, human_list, rng)
+
+
+def run_scenario(spec):
+    """
+    Run a scenario for spec["steps"] steps, where humans flee, zombies
+    stalk and humans caught by a zombie are removed
+
+    Returns a dictionary with the scenario id and the survival curve,
+    the number of humans left before the first step and after each step
+    """
+    full_spec = dict(SCENARIO_DEFAULTS, **spec)
+    full_spec["seed"] = scenario_seed(spec)
+    simulation = make_scenario(full_spec)
+    simulation.capture_humans()
+    survivors = [simulation.num_humans()]
+    for dummy_step in range(full_spec["steps"]):
+        if simulation.num_humans() == 0:
+            survivors.append(0)
+            continue
+        zombie_distance = simulation.compute_distance_field(ZOMBIE, full_spec["radius"])
+        simulation.move_humans(zombie_distance)
+        human_distance = simulation.compute_distance_field(HUMAN, full_spec["radius"])
+        simulation.move_zombies(human_distance)
+        simulation.capture_humans()
+        survivors.append(simulation.num_humans())
+    return {"id": spec.get("id"), "spec": full_spec, "survivors": survivors}
+
+
+def load_results(results_file):
+    """
+    Return the scenario results stored in results_file, one JSON object
+    per line, skipping lines that cannot be read
+    """
+    results = []
+    if not os.path.exists(results_file):
+        return results
+    with open(results_file) as results_input:
+        for line in results_input:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue
+    return results
+
+
+def drop_partial_line(results_file):
+    """
+    Truncate results_file after its last newline, dropping a line left
+    half written by an interrupted batch
+    """
+    if not os.path.exists(results_file):
+        return
+    with open(results_file, "rb+") as results_output:
+        data = results_output.read()
+        results_output.truncate(data.rfind(b"\n") + 1)
+
+
+def run_batch(specs, results_file, processes=None, summary_file=None):
+    """
+    Run many scenarios on a process pool, appending each result to
+    results_file as soon as it is done
+
+    specs: list of scenario specifications, their "id" keys must be
+    unique strings or integers and default to their position in the list
+    processes: number of worker processes, defaults to the CPU count
+    summary_file: file the aggregated survival curve is written to as
+    JSON, defaults to results_file with a .summary.json extension
+
+    Scenarios already recorded in results_file are skipped, so an
+    interrupted batch resumes where it stopped. Returns the aggregated
+    survival curve of every scenario in the batch
+    """
+    specs = [dict(spec, id=spec.get("id", idx)) for idx, spec in enumerate(specs)]
+    drop_partial_line(results_file)
+    done = set([result["id"] for result in load_results(results_file)])
+    pending = [spec for spec in specs if spec["id"] not in done]
+    if pending:
+        pool = multiprocessing.Pool(processes)
+        try:
+            with open(results_file, "a") as results_output:
+                for result in pool.imap_unordered(run_scenario, pending):
+                    results_output.write(json.dumps(result) + "\n")
+                    results_output.flush()
+        finally:
+            pool.close()
+            pool.join()
+    results = dict([(result["id"], result) for result in load_results(results_file)])
+    survival = aggregate_survival([results[spec["id"]] for spec in specs])
+    if summary_file is None:
+        summary_file = os.path.splitext(results_file)[0] + ".summary.json"
+    with open(summary_file, "w") as summary_output:
+        json.dump({"scenarios": len(specs), "survival": survival}, summary_output)
+    return survival
+
+
+def aggregate_survival(results):
+    """
+    Combine survival curves into the mean fraction of humans alive
+    after each step
+
+    Scenarios that start without humans are left out
+    """
+    totals = []
+    count = 0
+    for result in results:
+        survivors = result["survivors"]
+        if not survivors or survivors[0] == 0:
+            continue
+        count += 1
+        for step, alive in enumerate(survivors):
+            if step == len(totals):
+                totals.append(0.0)
+            totals[step] += float(alive) / survivors[0]
+    if count == 0:
+        return []
+    return [total / count for total in totals]
 
 
 # Start up gui for simulation - You will need to write some code above
 # before this will work without errors
 
-poc_zombie_gui.run_gui(Zombie(30, 40))
+if __name__ == "__main__":
+    poc_zombie_testsuite.run_suite(Zombie, run_batch, poc_zombie_gui.GridRenderer)
+    poc_zombie_gui.run_gui(Zombie(30, 40))
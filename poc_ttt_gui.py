@@ -6,8 +6,16 @@ try:
     import simplegui
 except ImportError:
     import SimpleGUICS2Pygame.simpleguics2pygame as simplegui
+import pickle
 import poc_ttt_provided as provided
 
+# The move service needs asyncio and concurrent.futures, without them the
+# AI moves are computed synchronously
+try:
+    import poc_ttt_service
+except ImportError:
+    poc_ttt_service = None
+
 GUI_WIDTH = 400
 GUI_HEIGHT = GUI_WIDTH
 BAR_WIDTH = 5
@@ -18,7 +26,7 @@ class TicTacGUI:
     GUI for Tic Tac Toe game.
     """
 
-    def __init__(self, size, aiplayer, aifunction, ntrials, reverse=False):
+    def __init__(self, size, aiplayer, aifunction, ntrials, reverse=False, service=None):
         # Game board
         self._size = size
         self._bar_spacing = GUI_WIDTH // self._size
@@ -30,6 +38,11 @@ class TicTacGUI:
         self._aiplayer = aiplayer
         self._aifunction = aifunction
         self._ntrials = ntrials
+        if service is None and poc_ttt_service is not None:
+            service = poc_ttt_service.MoveService(max_workers=1)
+        self._service = service
+        self._game_id = 0
+        self._pending = None
 
         # Set up data structures
         self.setup_frame()
@@ -62,6 +75,10 @@ class TicTacGUI:
         """
         Start new game.
         """
+        if self._service is not None:
+            self._service.cancel_game(self._game_id)
+        self._game_id += 1
+        self._pending = None
         self._board = provided.TTTBoard(self._size, self._reverse)
         self._inprogress = True
         self._wait = False
@@ -137,11 +154,40 @@ class TicTacGUI:
     def aimove(self):
         """
         Make AI move.
+
+        With a move service the move is computed in the background, each
+        frame checks whether it is ready so the GUI stays responsive.
         """
         if self._inprogress and (self._turn == self._aiplayer):
-            row, col = self._aifunction(self._board,
-                                        self._aiplayer,
-                                        self._ntrials)
+            if self._service is None:
+                row, col = self._aifunction(self._board,
+                                            self._aiplayer,
+                                            self._ntrials)
+            elif self._pending is None:
+                self._pending = self._service.submit(self._game_id,
+                                                     self._aifunction,
+                                                     self._board,
+                                                     self._aiplayer,
+                                                     self._ntrials)
+                return
+            elif not self._pending.done():
+                return
+            else:
+                future = self._pending
+                self._pending = None
+                error = future.exception()
+                if isinstance(error, (pickle.PicklingError, AttributeError, TypeError)) \
+                        and not self._pickles(self._aifunction):
+                    # the pool cannot receive this function, compute
+                    # its moves in the GUI from now on
+                    self._service = None
+                    row, col = self._aifunction(self._board,
+                                                self._aiplayer,
+                                                self._ntrials)
+                elif error is not None:
+                    raise error
+                else:
+                    row, col = future.result()
             if self._board.square(row, col) == provided.EMPTY:
                 self._board.move(row, col, self._aiplayer)
             self._turn = self._humanplayer
@@ -149,6 +195,17 @@ class TicTacGUI:
             if winner is not None:
                 self.game_over(winner)
 
+    @staticmethod
+    def _pickles(function):
+        """
+        Checks whether function can be sent to worker processes
+        """
+        try:
+            pickle.dumps(function)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return False
+        return True
+
     def game_over(self, winner):
         """
         Game over
@@ -184,9 +241,9 @@ class TicTacGUI:
                 posx // self._bar_spacing)  # col
 
 
-def run_gui(board_size, ai_player, ai_function, ntrials, reverse=False):
+def run_gui(board_size, ai_player, ai_function, ntrials, reverse=False, service=None):
     """
     Instantiate and run the GUI
     """
-    gui = TicTacGUI(board_size, ai_player, ai_function, ntrials, reverse)
+    gui = TicTacGUI(board_size, ai_player, ai_function, ntrials, reverse, service)
     gui.start()
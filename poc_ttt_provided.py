@@ -2,6 +2,9 @@
 Provided Code for Tic-Tac-Toe
 """
 
+import copy
+import random
+
 # Constants
 EMPTY = 1
 PLAYERX = 2
@@ -14,116 +17,351 @@ STRMAP = {EMPTY: " ",
           PLAYERO: "O"}
 
 
-class TTTBoard:
+# Win masks and board symmetries for each board shape, computed on
+# first use
+WIN_MASKS = {}
+SYMMETRIES = {}
+
+# Directions along which a line can be completed, as (row, col) steps
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def get_win_masks(height, width=None, win_length=None):
+    """
+    Return the list of bitmasks of every run of win_length squares in a
+    row, column or diagonal of a height x width board, where square
+    (row, col) is bit row * width + col. Runs along rows come first,
+    then columns, then diagonals and anti-diagonals.
+
+    width and win_length default to height, the dim x dim board where
+    a full row, column or diagonal wins.
     """
-    Class to represent a Tic-Tac-Toe board.
+    if width is None:
+        width = height
+    if win_length is None:
+        win_length = height
+    key = (height, width, win_length)
+    if key not in WIN_MASKS:
+        masks = []
+        for drow, dcol in DIRECTIONS:
+            for row in range(height):
+                for col in range(width):
+                    end_row = row + drow * (win_length - 1)
+                    end_col = col + dcol * (win_length - 1)
+                    if 0 <= end_row < height and 0 <= end_col < width:
+                        mask = 0
+                        for step in range(win_length):
+                            mask |= 1 << ((row + drow * step) * width + col + dcol * step)
+                        masks.append(mask)
+        WIN_MASKS[key] = masks
+    return WIN_MASKS[key]
+
+
+class MNKBoard:
     """
+    Class to represent an m,n,k-game board: height x width squares,
+    where win_length squares in a row, column or diagonal win.
 
-    def __init__(self, dim, reverse=False, board=None):
-        self._dim = dim
+    The squares of each player are stored as one integer bitmask,
+    square (row, col) being bit row * width + col. A move can only win
+    along the lines through it, so the winner is found by counting the
+    player's squares outward from the last move in four directions. The
+    board also keeps the list of empty squares, so a random one is
+    picked in constant time.
+    """
+
+    def __init__(self, height, width, win_length, reverse=False, board=None):
+        self._height = height
+        self._width = width
+        self._win_length = win_length
         self._reverse = reverse
-        if board == None:
-            # Create empty board
-            self._board = [[EMPTY for dummycol in range(dim)]
-                           for dummyrow in range(dim)]
-        else:
+        self._xbits = 0
+        self._obits = 0
+        self._winner = None
+        self._empty = list(range(height * width))
+        self._empty_pos = list(range(height * width))
+        self._history = []
+        if board != None:
             # Copy board grid
-            self._board = [[board[row][col] for col in range(dim)]
-                           for row in range(dim)]
+            for row in range(height):
+                for col in range(width):
+                    if board[row][col] != EMPTY:
+                        self.move(row, col, board[row][col])
 
     def __str__(self):
         """
         Human readable representation of the board.
         """
         rep = ""
-        for row in range(self._dim):
-            for col in range(self._dim):
-                rep += STRMAP[self._board[row][col]]
-                if col == self._dim - 1:
+        for row in range(self._height):
+            for col in range(self._width):
+                rep += STRMAP[self.square(row, col)]
+                if col == self._width - 1:
                     rep += "\n"
                 else:
                     rep += " | "
-            if row != self._dim - 1:
-                rep += "-" * (4 * self._dim - 3)
+            if row != self._height - 1:
+                rep += "-" * (4 * self._width - 3)
                 rep += "\n"
         return rep
 
-    def get_dim(self):
+    def get_height(self):
         """
-        Return the dimension of the board.
+        Return the number of rows of the board.
         """
-        return self._dim
+        return self._height
+
+    def get_width(self):
+        """
+        Return the number of columns of the board.
+        """
+        return self._width
+
+    def get_win_length(self):
+        """
+        Return the number of squares in a row needed to win.
+        """
+        return self._win_length
+
+    def get_win_masks(self):
+        """
+        Return the bitmasks of the winning runs of the board, see
+        get_win_masks.
+        """
+        return get_win_masks(self._height, self._width, self._win_length)
+
+    def get_reverse(self):
+        """
+        Return whether the game is played in reverse, where the player
+        who completes a line loses.
+        """
+        return self._reverse
 
     def square(self, row, col):
         """
         Return the status (EMPTY, PLAYERX, PLAYERO) of the square at
         position (row, col).
         """
-        return self._board[row][col]
+        bit = 1 << (row * self._width + col)
+        if self._xbits & bit:
+            return PLAYERX
+        elif self._obits & bit:
+            return PLAYERO
+        return EMPTY
+
+    def get_bits(self, player):
+        """
+        Return the bitmask of the squares held by player, square
+        (row, col) being bit row * width + col.
+        """
+        if player == PLAYERX:
+            return self._xbits
+        return self._obits
 
     def get_empty_squares(self):
         """
         Return a list of (row, col) tuples for all empty squares
         """
+        occupied = self._xbits | self._obits
         empty = []
-        for row in range(self._dim):
-            for col in range(self._dim):
-                if self._board[row][col] == EMPTY:
+        for row in range(self._height):
+            for col in range(self._width):
+                if not occupied & (1 << (row * self._width + col)):
                     empty.append((row, col))
         return empty
 
+    def random_empty_square(self, rng=random):
+        """
+        Return a random empty square as a (row, col) tuple, using the
+        given random.Random or the random module.
+        """
+        index = self._empty[rng.randrange(len(self._empty))]
+        return index // self._width, index % self._width
+
     def move(self, row, col, player):
         """
         Place player on the board at position (row, col).
 
         Does nothing if board square is not empty.
         """
-        if self._board[row][col] == EMPTY:
-            self._board[row][col] = player
+        index = row * self._width + col
+        if (self._xbits | self._obits) & (1 << index):
+            return
+        self._place(row, col, player)
 
-    def check_win(self):
+    def make_move(self, row, col, player):
         """
-        If someone has won, return player.
-        If game is a draw, return DRAW.
-        If game is in progress, return None.
+        Place player on the empty square (row, col), recording the move
+        so that undo_move can take it back.
         """
-        lines = []
+        self._history.append((row * self._width + col, self._winner))
+        self._place(row, col, player)
 
-        # rows
-        lines.extend(self._board)
+    def undo_move(self):
+        """
+        Take back the last move made with make_move.
+        """
+        index, winner = self._history.pop()
+        bit = 1 << index
+        if self._xbits & bit:
+            self._xbits ^= bit
+        else:
+            self._obits ^= bit
+        self._empty_pos[index] = len(self._empty)
+        self._empty.append(index)
+        self._winner = winner
 
-        # cols
-        cols = [[self._board[rowidx][colidx] for rowidx in range(self._dim)]
-                for colidx in range(self._dim)]
-        lines.extend(cols)
+    def _place(self, row, col, player):
+        """
+        Place player on the empty square (row, col), updating the winner
+        and the empty squares.
+        """
+        index = row * self._width + col
+        if player == PLAYERX:
+            self._xbits |= 1 << index
+            bits = self._xbits
+        else:
+            self._obits |= 1 << index
+            bits = self._obits
+        for drow, dcol in DIRECTIONS:
+            count = 1 + self._count_run(bits, row, col, drow, dcol) \
+                + self._count_run(bits, row, col, -drow, -dcol)
+            if count >= self._win_length:
+                if self._winner is None:
+                    self._winner = player
+                elif self._winner != player:
+                    # both players hold a line, the first one in
+                    # get_win_masks order decides as in a full scan
+                    self._winner = self._scan_winner()
+                break
 
-        # diags
-        diag1 = [self._board[idx][idx] for idx in range(self._dim)]
-        diag2 = [self._board[idx][self._dim - idx - 1]
-                 for idx in range(self._dim)]
-        lines.append(diag1)
-        lines.append(diag2)
+        # swap the square with the last empty one and drop it
+        pos = self._empty_pos[index]
+        last = self._empty.pop()
+        if last != index:
+            self._empty[pos] = last
+            self._empty_pos[last] = pos
 
-        # check all lines
-        for line in lines:
-            if len(set(line)) == 1 and line[0] != EMPTY:
-                if self._reverse:
-                    return switch_player(line[0])
-                else:
-                    return line[0]
+    def _count_run(self, bits, row, col, drow, dcol):
+        """
+        Return how many squares of bits follow (row, col) in direction
+        (drow, dcol), stopping at win_length.
+        """
+        count = 0
+        row += drow
+        col += dcol
+        while (count < self._win_length and 0 <= row < self._height and 0 <= col < self._width
+               and bits & (1 << (row * self._width + col))):
+            count += 1
+            row += drow
+            col += dcol
+        return count
+
+    def check_win(self):
+        """
+        If someone has won, return player.
+        If game is a draw, return DRAW.
+        If game is in progress, return None.
+        """
+        if self._winner is not None:
+            if self._reverse:
+                return switch_player(self._winner)
+            else:
+                return self._winner
 
         # no winner, check for draw
-        if len(self.get_empty_squares()) == 0:
+        if not self._empty:
             return DRAW
 
         # game is still in progress
         return None
 
+    def _scan_winner(self):
+        """
+        Return the owner of the first complete line, or None.
+        """
+        for mask in self.get_win_masks():
+            if self._xbits & mask == mask:
+                return PLAYERX
+            elif self._obits & mask == mask:
+                return PLAYERO
+        return None
+
     def clone(self):
         """
-        Return a copy of the board.
+        Return a copy of the board, without its move history.
         """
-        return TTTBoard(self._dim, self._reverse, self._board)
+        board = copy.copy(self)
+        board._empty = list(self._empty)
+        board._empty_pos = list(self._empty_pos)
+        board._history = []
+        return board
+
+
+class TTTBoard(MNKBoard):
+    """
+    Class to represent a Tic-Tac-Toe board, a dim x dim board where a
+    full row, column or diagonal wins.
+    """
+
+    def __init__(self, dim, reverse=False, board=None):
+        self._dim = dim
+        MNKBoard.__init__(self, dim, dim, dim, reverse, board)
+
+    def get_dim(self):
+        """
+        Return the dimension of the board.
+        """
+        return self._dim
+
+
+def get_symmetries(height, width=None):
+    """
+    Return the symmetries of a height x width board as lists perm where
+    square index j of the transformed board is square perm[j] of the
+    original board, the identity first. Square boards have 8
+    symmetries, other boards 4.
+    """
+    if width is None:
+        width = height
+    if (height, width) not in SYMMETRIES:
+        transforms = [lambda row, col: (row, col),
+                      lambda row, col: (height - 1 - row, width - 1 - col),
+                      lambda row, col: (row, width - 1 - col),
+                      lambda row, col: (height - 1 - row, col)]
+        if height == width:
+            transforms.extend([lambda row, col: (col, width - 1 - row),
+                               lambda row, col: (width - 1 - col, row),
+                               lambda row, col: (col, row),
+                               lambda row, col: (width - 1 - col, height - 1 - row)])
+        perms = []
+        for transform in transforms:
+            perm = []
+            for index in range(height * width):
+                row, col = transform(index // width, index % width)
+                perm.append(row * width + col)
+            perms.append(perm)
+        SYMMETRIES[(height, width)] = perms
+    return SYMMETRIES[(height, width)]
+
+
+def canonical_form(board):
+    """
+    Return a (key, perm) tuple where key is the smallest tuple of
+    squares over the symmetries of the board and perm is the symmetry
+    from get_symmetries that produces it.
+    """
+    height = board.get_height()
+    width = board.get_width()
+    squares = [board.square(index // width, index % width) for index in range(height * width)]
+    best_key = None
+    best_perm = None
+    for perm in get_symmetries(height, width):
+        key = tuple([squares[index] for index in perm])
+        if best_key is None or key < best_key:
+            best_key = key
+            best_perm = perm
+    return best_key, best_perm
 
 
 def switch_player(player):
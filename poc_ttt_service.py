@@ -0,0 +1,137 @@
+"""
+Move computation service for running many Tic-Tac-Toe games at once
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+class MoveLimitError(Exception):
+    """
+    Raised when a game already has as many searches in flight as the
+    service allows
+    """
+    pass
+
+
+class MoveService:
+    """
+    Runs AI move functions on a shared worker pool.
+
+    submit returns a concurrent.futures.Future, for callers with their
+    own event loop such as the GUI, and request_move is a coroutine for
+    asyncio callers. Each game has at most max_in_flight searches
+    running or queued, and cancel_game drops the searches of an
+    abandoned game.
+    """
+
+    def __init__(self, max_workers=None, max_in_flight=1, executor=None):
+        """
+        Create a service on a process pool of max_workers processes, or
+        on the given concurrent.futures executor
+        """
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+        self._executor = executor
+        self._max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._semaphores = {}
+        self._waiters = {}
+        self._generations = {}
+
+    def num_in_flight(self, game_id):
+        """
+        Return the number of searches of the game that are running or
+        queued
+        """
+        with self._lock:
+            return len(self._prune(game_id))
+
+    def submit(self, game_id, move_function, board, player, ntrials):
+        """
+        Start computing move_function(board, player, ntrials) for the
+        game on a copy of the board and return its future
+
+        Raises MoveLimitError if the game already has max_in_flight
+        searches
+        """
+        with self._lock:
+            futures = self._prune(game_id)
+            if len(futures) >= self._max_in_flight:
+                raise MoveLimitError("game %s already has %d searches in flight"
+                                     % (game_id, len(futures)))
+            future = self._executor.submit(move_function, board.clone(), player, ntrials)
+            futures.append(future)
+            self._in_flight[game_id] = futures
+            return future
+
+    async def request_move(self, game_id, move_function, board, player, ntrials):
+        """
+        Coroutine that computes move_function(board, player, ntrials)
+        for the game and returns the move, waiting for a free slot if
+        the game already has max_in_flight searches
+
+        Raises asyncio.CancelledError if the game is cancelled
+        """
+        loop = asyncio.get_running_loop()
+        generation = self._generations.get(game_id, 0)
+        if (game_id, loop) not in self._semaphores:
+            self._semaphores[(game_id, loop)] = asyncio.Semaphore(self._max_in_flight)
+        async with self._semaphores[(game_id, loop)]:
+            while True:
+                if self._generations.get(game_id, 0) != generation:
+                    # the game was cancelled while this request was queued
+                    raise asyncio.CancelledError()
+                try:
+                    future = self.submit(game_id, move_function, board, player, ntrials)
+                    break
+                except MoveLimitError:
+                    # a slot is held by a search submitted without request_move
+                    await asyncio.sleep(0.01)
+            waiter = asyncio.wrap_future(future)
+            with self._lock:
+                self._waiters.setdefault(game_id, []).append((loop, waiter))
+            try:
+                return await waiter
+            finally:
+                with self._lock:
+                    if (loop, waiter) in self._waiters.get(game_id, []):
+                        self._waiters[game_id].remove((loop, waiter))
+
+    def cancel_game(self, game_id):
+        """
+        Cancel the searches of an abandoned game
+
+        Queued searches never run. Running searches cannot be
+        interrupted, but coroutines waiting for them are cancelled and
+        they no longer count against the game.
+        """
+        with self._lock:
+            futures = self._in_flight.pop(game_id, [])
+            waiters = self._waiters.pop(game_id, [])
+            self._generations[game_id] = self._generations.get(game_id, 0) + 1
+            for key in list(self._semaphores):
+                if key[0] == game_id:
+                    del self._semaphores[key]
+        for future in futures:
+            future.cancel()
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.cancel)
+
+    def shutdown(self):
+        """
+        Stop the worker pool, dropping queued searches
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self, game_id):
+        """
+        Drop the finished searches of the game and return the list of
+        its remaining ones, the lock must be held
+        """
+        futures = [future for future in self._in_flight.pop(game_id, []) if not future.done()]
+        if futures:
+            self._in_flight[game_id] = futures
+        return futures
@@ -0,0 +1,173 @@
+"""
+Test suite for the m,n,k-game board of Tic-Tac-Toe
+Note that tests are not exhaustive and should be supplemented
+"""
+
+import random
+import poc_simpletest
+
+EMPTY = 1
+PLAYERX = 2
+PLAYERO = 3
+DRAW = 4
+
+# Board shapes as (height, width, win_length)
+SHAPES = [(3, 3, 3), (4, 4, 4), (3, 3, 2), (4, 5, 3), (5, 3, 3), (2, 6, 4), (6, 6, 4), (1, 5, 3)]
+
+
+class PickIndex:
+    """
+    Stand-in for random.Random whose randrange returns a given index
+    """
+
+    def __init__(self, index):
+        self._index = index
+
+    def randrange(self, stop):
+        """
+        Return the given index
+        """
+        return self._index
+
+
+def scan_winner(board):
+    """
+    Return the owner of the first complete line of the board, scanning
+    every run of win_length squares in rows, columns and diagonals, or
+    None
+    """
+    height = board.get_height()
+    width = board.get_width()
+    win_length = board.get_win_length()
+    for mask in board.get_win_masks():
+        squares = [board.square(index // width, index % width)
+                   for index in range(height * width) if mask & (1 << index)]
+        if len(squares) == win_length and squares[0] != EMPTY and squares.count(squares[0]) == win_length:
+            return squares[0]
+    return None
+
+
+def scan_check_win(board):
+    """
+    Return check_win of the board computed by a full scan
+    """
+    winner = scan_winner(board)
+    if winner is not None:
+        if board.get_reverse():
+            return PLAYERX + PLAYERO - winner
+        return winner
+    if not scan_empty_squares(board):
+        return DRAW
+    return None
+
+
+def scan_empty_squares(board):
+    """
+    Return the sorted list of empty squares of the board
+    """
+    return [(row, col) for row in range(board.get_height()) for col in range(board.get_width())
+            if board.square(row, col) == EMPTY]
+
+
+def drawn_empty_squares(board):
+    """
+    Return the sorted list of squares random_empty_square can return
+    """
+    return sorted([board.random_empty_square(PickIndex(index))
+                   for index in range(len(board.get_empty_squares()))])
+
+
+def board_state(board):
+    """
+    Return the squares, empty squares and check_win of the board
+    """
+    squares = [[board.square(row, col) for col in range(board.get_width())]
+               for row in range(board.get_height())]
+    return squares, board.get_empty_squares(), drawn_empty_squares(board), board.check_win()
+
+
+def run_mask_tests(board_class, suite):
+    """
+    Check the winning runs of boards of several shapes
+    """
+    for height, width, win_length in SHAPES:
+        board = board_class(height, width, win_length)
+        num_runs = 0
+        for drow, dcol in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+            rows = height - (win_length - 1) * drow
+            cols = width - (win_length - 1) * abs(dcol)
+            num_runs += max(0, rows) * max(0, cols)
+        suite.run_test(len(set(board.get_win_masks())), num_runs,
+                       "Test #1: number of winning runs of %dx%d, %d in a row" % (height, width, win_length))
+
+
+def run_game_tests(board_class, suite, games=300):
+    """
+    Play random games with make_move and undo_move, checking check_win
+    against a full scan and that every undo restores the board
+    """
+    rng = random.Random(0)
+    for game in range(games):
+        height, width, win_length = rng.choice(SHAPES)
+        reverse = rng.random() < 0.5
+        board = board_class(height, width, win_length, reverse)
+        player = PLAYERX
+        states = []
+        failed = False
+        while board.check_win() is None:
+            states.append(board_state(board))
+            row, col = board.random_empty_square(rng)
+            board.make_move(row, col, player)
+            if board.check_win() != scan_check_win(board) or \
+                    drawn_empty_squares(board) != scan_empty_squares(board):
+                suite.run_test(board_state(board)[1:], (scan_empty_squares(board), scan_empty_squares(board),
+                                                        scan_check_win(board)),
+                               "Test #2: game %d on %dx%d, %d in a row, after %s\n%s"
+                               % (game, height, width, win_length, (row, col), board))
+                failed = True
+                break
+            player = PLAYERX + PLAYERO - player
+        while states and not failed:
+            board.undo_move()
+            state = states.pop()
+            if board_state(board) != state:
+                suite.run_test(board_state(board), state,
+                               "Test #3: game %d on %dx%d, %d in a row, undo to move %d"
+                               % (game, height, width, win_length, len(states)))
+                failed = True
+        if not failed:
+            suite.run_test(board.get_empty_squares(), scan_empty_squares(board),
+                           "Test #4: game %d fully undone" % game)
+
+
+def run_copy_tests(board_class, suite, trials=300):
+    """
+    Check boards built from a grid of squares, including grids where
+    both players hold a line, and their clones
+    """
+    rng = random.Random(1)
+    for trial in range(trials):
+        height, width, win_length = rng.choice(SHAPES)
+        grid = [[rng.choice([EMPTY, EMPTY, PLAYERX, PLAYERO]) for dummy_col in range(width)]
+                for dummy_row in range(height)]
+        board = board_class(height, width, win_length, False, grid)
+        suite.run_test((board_state(board)[0], board.check_win()), (grid, scan_check_win(board)),
+                       "Test #5: board built from %s with %d in a row" % (grid, win_length))
+        clone = board.clone()
+        empty = clone.get_empty_squares()
+        if empty:
+            clone.make_move(empty[0][0], empty[0][1], PLAYERX)
+            clone.undo_move()
+        suite.run_test(board_state(clone), board_state(board), "Test #6: clone of %s" % grid)
+
+
+def run_suite(board_class):
+    """
+    Some informal testing code for a board class built as
+    board_class(height, width, win_length, reverse, board)
+    """
+    suite = poc_simpletest.TestSuite()
+    run_mask_tests(board_class, suite)
+    run_game_tests(board_class, suite)
+    run_copy_tests(board_class, suite)
+    suite.report_results()
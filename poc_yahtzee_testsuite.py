@@ -0,0 +1,164 @@
+"""
+Test suite checking the Yahtzee planner against brute force enumeration
+Note that tests are not exhaustive and should be supplemented
+"""
+
+import itertools
+import random
+import poc_simpletest
+
+# Largest error allowed between floating point expected values
+TOLERANCE = 1e-9
+
+
+def brute_score(hand):
+    """
+    Return the maximal upper section score of a hand
+    """
+    max_value = 0
+    for num in hand:
+        max_value = max(max_value, hand.count(num) * num)
+    return max_value
+
+
+def brute_holds(hand):
+    """
+    Return the set of sorted holds of a hand, from every subset of its
+    positions
+    """
+    holds = set()
+    for mask in range(2 ** len(hand)):
+        holds.add(tuple(sorted([hand[pos] for pos in range(len(hand)) if mask & (1 << pos)])))
+    return holds
+
+
+def brute_expected_value(held_dice, num_die_sides, num_free_dice, value=brute_score):
+    """
+    Return the mean of value over every ordered roll of the free dice
+    added to the held dice
+    """
+    total = 0.0
+    rolls = list(itertools.product(range(1, num_die_sides + 1), repeat=num_free_dice))
+    for roll in rolls:
+        total += value(tuple(held_dice) + roll)
+    return total / len(rolls)
+
+
+def brute_strategy(hand, num_die_sides, value=brute_score):
+    """
+    Return the best expected value over every hold of a hand, the value
+    of a final hand being given by value
+    """
+    return max([brute_expected_value(hold, num_die_sides, len(hand) - len(hold), value)
+                for hold in brute_holds(hand)])
+
+
+def random_hand(rng, num_die_sides, num_dice):
+    """
+    Return a random unsorted hand
+    """
+    return tuple([rng.randint(1, num_die_sides) for dummy_idx in range(num_dice)])
+
+
+def run_score_tests(score, gen_all_holds, suite, trials=300):
+    """
+    Check score and gen_all_holds against brute force
+    """
+    rng = random.Random(0)
+    for trial in range(trials):
+        hand = random_hand(rng, rng.randint(1, 8), rng.randint(0, 6))
+        suite.run_test(score(hand), brute_score(hand), "Test #%d: score of %s" % (trial, hand))
+        suite.run_test(gen_all_holds(hand), brute_holds(hand), "Test #%d: holds of %s" % (trial, hand))
+
+
+def run_expected_value_tests(expected_values, suite, trials=300):
+    """
+    Check every expected value function against brute force
+    """
+    rng = random.Random(1)
+    for trial in range(trials):
+        num_die_sides = rng.randint(1, 6)
+        held_dice = random_hand(rng, num_die_sides, rng.randint(0, 3))
+        num_free_dice = rng.randint(0, 4)
+        expected = brute_expected_value(held_dice, num_die_sides, num_free_dice)
+        for function in expected_values:
+            computed = function(held_dice, num_die_sides, num_free_dice)
+            suite.run_test(abs(computed - expected) < TOLERANCE, True,
+                           "Test #%d: %s%s computed %r, expected %r"
+                           % (trial, function.__name__, (held_dice, num_die_sides, num_free_dice),
+                              computed, expected))
+
+
+def check_plan(plan, hand, expected_score, expected_value):
+    """
+    Return True if the expected score of plan is expected_score and the
+    hold it returns is a hold of hand worth that score
+    """
+    computed_score, hold = plan
+    return (abs(computed_score - expected_score) < TOLERANCE and hold in brute_holds(hand)
+            and abs(expected_value(hold) - expected_score) < TOLERANCE)
+
+
+def run_strategy_tests(strategy, plan_turn, suite, trials=50):
+    """
+    Check strategy, and plan_turn if given, against brute force, the
+    second reroll of plan_turn being valued by a naive loop over every
+    ordered roll
+    """
+    rng = random.Random(2)
+    for trial in range(trials):
+        num_die_sides = rng.randint(1, 5)
+        hand = random_hand(rng, num_die_sides, rng.randint(0, 4))
+        expected = brute_strategy(hand, num_die_sides)
+        suite.run_test(check_plan(strategy(hand, num_die_sides), hand, expected,
+                                  lambda hold: brute_expected_value(hold, num_die_sides, len(hand) - len(hold))),
+                       True, "Test #%d: strategy of %s with %d sides" % (trial, hand, num_die_sides))
+        if plan_turn is None:
+            continue
+        second_stage = {}
+
+        def second_value(final_hand):
+            """
+            Return the best expected value of a hand with one reroll left
+            """
+            key = tuple(sorted(final_hand))
+            if key not in second_stage:
+                second_stage[key] = brute_strategy(key, num_die_sides)
+            return second_stage[key]
+
+        expected = brute_strategy(hand, num_die_sides, second_value)
+        suite.run_test(check_plan(plan_turn(hand, num_die_sides), hand, expected,
+                                  lambda hold: brute_expected_value(hold, num_die_sides, len(hand) - len(hold),
+                                                                    second_value)),
+                       True, "Test #%d: plan_turn of %s with %d sides" % (trial, hand, num_die_sides))
+
+
+def run_batch_tests(strategy, batch_strategy, suite, trials=200):
+    """
+    Check that batch_strategy agrees with strategy on each hand and
+    that the encoded holds keep the dice strategy holds
+    """
+    rng = random.Random(3)
+    for num_die_sides, num_dice in [(6, 5), (4, 3), (6, 1)]:
+        hands = [random_hand(rng, num_die_sides, num_dice) for dummy_idx in range(trials)]
+        scores, holds = batch_strategy(hands, num_die_sides)
+        for hand, hand_score, mask in zip(hands, list(scores), list(holds)):
+            expected = strategy(tuple(sorted(hand)), num_die_sides)
+            hold = tuple(sorted([hand[pos] for pos in range(num_dice) if int(mask) & (1 << pos)]))
+            suite.run_test((abs(hand_score - expected[0]) < TOLERANCE, hold), (True, expected[1]),
+                           "Test: batch_strategy of %s with %d sides" % (hand, num_die_sides))
+
+
+def run_suite(score, gen_all_holds, expected_values, strategy, plan_turn=None, batch_strategy=None):
+    """
+    Some informal testing code checking the planner against brute
+    force, expected_values being a list of functions computing
+    expected_value
+    """
+    suite = poc_simpletest.TestSuite()
+    run_score_tests(score, gen_all_holds, suite)
+    run_expected_value_tests(expected_values, suite)
+    run_strategy_tests(strategy, plan_turn, suite)
+    if batch_strategy is not None:
+        run_batch_tests(strategy, batch_strategy, suite)
+    suite.report_results()
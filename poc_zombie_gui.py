@@ -26,6 +26,155 @@ CELL_SIZE = 10
 LABEL_STRING = "Mouse click: Add "
 
 
+class GridRenderer:
+    """
+    Draws the simulation, recomputing only the cells that changed since
+    the last frame
+    """
+
+    def __init__(self, simulation, persistent_canvas=False):
+        """
+        Create a renderer for the simulation
+
+        If persistent_canvas is False the canvas is assumed to be cleared
+        between frames, so every non-empty cell is drawn each frame from
+        the cached rows, with runs of obstacles in a row drawn as one
+        polygon. SimpleGUI has no off-screen canvas to keep a background
+        on, so the draw count of a cleared canvas is bounded by the
+        number of such runs and agents, not by the changed cells.
+        """
+        self._simulation = simulation
+        self._grid_height = self._simulation.get_grid_height()
+        self._grid_width = self._simulation.get_grid_width()
+        self._persistent_canvas = persistent_canvas
+        self._layer = {}
+        self._runs = {}
+        self._agents = {}
+        self._dirty = set()
+        self._num_marked = 0
+        self._full_repaint = True
+        self._version = None
+        self._repaint_count = 0
+        self._draw_count = 0
+
+    def get_repaint_count(self):
+        """
+        Return the number of cells recomputed in the last frame, on a
+        persistent canvas these are the cells painted
+        """
+        return self._repaint_count
+
+    def get_draw_count(self):
+        """
+        Return the number of polygons drawn in the last frame
+        """
+        return self._draw_count
+
+    def mark_dirty(self, row, col):
+        """
+        Mark a cell as changed since the last frame, call once for
+        each obstacle edit
+        """
+        self._dirty.add((row, col))
+        self._num_marked += 1
+
+    def request_full_repaint(self):
+        """
+        Recompute and repaint every cell on the next frame
+        """
+        self._full_repaint = True
+
+    def draw(self, canvas):
+        """
+        Bring the cached layer up to date and paint it on the canvas
+        """
+        agents = {}
+        for cell in self._simulation.humans():
+            agents[cell] = agents.get(cell, EMPTY) | HAS_HUMAN
+        for cell in self._simulation.zombies():
+            agents[cell] = agents.get(cell, EMPTY) | HAS_ZOMBIE
+        for cell in set(agents).union(self._agents):
+            if agents.get(cell) != self._agents.get(cell):
+                self._dirty.add(cell)
+        self._agents = agents
+        if hasattr(self._simulation, "get_version"):
+            # more obstacle edits than marked cells, some were not
+            # marked, fall back to a full repaint
+            version = self._simulation.get_version()
+            if self._version is None or version - self._version > self._num_marked:
+                self._full_repaint = True
+            self._version = version
+        self._num_marked = 0
+
+        if self._full_repaint:
+            self._layer = {}
+            self._runs = {}
+            self._dirty = set([(row, col) for row in range(self._grid_height)
+                               for col in range(self._grid_width)])
+        self._dirty = set([cell for cell in self._dirty
+                           if 0 <= cell[0] < self._grid_height and 0 <= cell[1] < self._grid_width])
+        for cell in self._dirty:
+            self.update_cell(cell[0], cell[1])
+
+        if self._persistent_canvas:
+            # empty cells are painted too, to erase what they showed
+            painted = [(cell[0], cell[1], 1, self._layer.get(cell[0], {}).get(cell[1], CELL_COLORS[EMPTY]))
+                       for cell in self._dirty]
+        else:
+            for row in set([cell[0] for cell in self._dirty]):
+                self._runs[row] = self._row_runs(row)
+            painted = [run for row in self._runs for run in self._runs[row]]
+        for row, col, num_cols, color in painted:
+            draw_cell(canvas, row, col, color, num_cols)
+        self._repaint_count = len(self._dirty)
+        self._draw_count = len(painted)
+        self._dirty = set()
+        self._full_repaint = False
+
+    def update_cell(self, row, col):
+        """
+        Recompute the color of a cell in the cached layer
+        """
+        status = EMPTY if self._simulation.is_empty(row, col) else FULL
+        color = CELL_COLORS[status | self._agents.get((row, col), EMPTY)]
+        row_colors = self._layer.setdefault(row, {})
+        if color != CELL_COLORS[EMPTY]:
+            row_colors[col] = color
+        elif col in row_colors:
+            del row_colors[col]
+
+    def _row_runs(self, row):
+        """
+        Return the (row, col, number of columns, color) polygons that
+        draw the non-empty cells of a row of the cached layer, adjacent
+        obstacles are merged since their borders match their fill
+        """
+        runs = []
+        row_colors = self._layer.get(row, {})
+        for col in sorted(row_colors):
+            color = row_colors[col]
+            if (runs and color == CELL_COLORS[FULL] and runs[-1][3] == color
+                    and runs[-1][1] + runs[-1][2] == col):
+                runs[-1] = (row, runs[-1][1], runs[-1][2] + 1, color)
+            else:
+                runs.append((row, col, 1, color))
+        return runs
+
+
+def draw_cell(canvas, row, col, color="Cyan", num_cols=1):
+    """
+    Draw a cell in the grid, or num_cols cells of a row as one polygon,
+    empty cells are drawn without a border so they erase the cell on a
+    persistent canvas
+    """
+    upper_left = [col * CELL_SIZE, row * CELL_SIZE]
+    upper_right = [(col + num_cols) * CELL_SIZE, row * CELL_SIZE]
+    lower_right = [(col + num_cols) * CELL_SIZE, (row + 1) * CELL_SIZE]
+    lower_left = [col * CELL_SIZE, (row + 1) * CELL_SIZE]
+    line_color = "Black" if color != CELL_COLORS[EMPTY] else color
+    canvas.draw_polygon([upper_left, upper_right, lower_right, lower_left], 1, line_color, color)
+
+
 class ZombieGUI:
     """
     Container for interactive content
@@ -38,6 +187,7 @@ class ZombieGUI:
         self._simulation = simulation
         self._grid_height = self._simulation.get_grid_height()
         self._grid_width = self._simulation.get_grid_width()
+        self._renderer = GridRenderer(self._simulation)
         self._frame = simplegui.create_frame("Zombie Apocalypse simulation",
                                              self._grid_width * CELL_SIZE, self._grid_height * CELL_SIZE)
         self._frame.set_canvas_background("White")
@@ -60,6 +210,7 @@ class ZombieGUI:
         Event handler for button that clears everything
         """
         self._simulation.clear()
+        self._renderer.request_full_repaint()
 
     def flee(self):
         """ 
@@ -99,6 +250,7 @@ class ZombieGUI:
         if self._item_type == OBSTACLE:
             if not self.is_occupied(row, col):
                 self._simulation.set_full(row, col)
+                self._renderer.mark_dirty(row, col)
         elif self._item_type == ZOMBIE:
             if self._simulation.is_empty(row, col):
                 self._simulation.add_zombie(row, col)
@@ -113,38 +265,17 @@ class ZombieGUI:
         cell = (row, col)
         return (cell in self._simulation.zombies()) or (cell in self._simulation.humans())
 
-    def draw_cell(self, canvas, row, col, color="Cyan"):
-        """
-        Draw a cell in the grid
-        """
-        upper_left = [col * CELL_SIZE, row * CELL_SIZE]
-        upper_right = [(col + 1) * CELL_SIZE, row * CELL_SIZE]
-        lower_right = [(col + 1) * CELL_SIZE, (row + 1) * CELL_SIZE]
-        lower_left = [col * CELL_SIZE, (row + 1) * CELL_SIZE]
-        canvas.draw_polygon([upper_left, upper_right, lower_right, lower_left], 1, "Black", color)
-
-    def draw_grid(self, canvas, grid):
+    def get_repaint_count(self):
         """
-        Draw entire grid
+        Return the number of cells painted in the last frame
         """
-        for col in range(self._grid_width):
-            for row in range(self._grid_height):
-                color = CELL_COLORS[grid[row][col]]
-                if color != "White":
-                    self.draw_cell(canvas, row, col, color)
+        return self._renderer.get_repaint_count()
 
     def draw(self, canvas):
         """
         Handler for drawing obstacle grid, human queue and zombie queue
         """
-        grid = [[EMPTY if self._simulation.is_empty(dummy_row, dummy_col) else FULL \
-                 for dummy_col in range(self._grid_width)] \
-                for dummy_row in range(self._grid_height)]
-        for row, col in self._simulation.humans():
-            grid[row][col] |= HAS_HUMAN
-        for row, col in self._simulation.zombies():
-            grid[row][col] |= HAS_ZOMBIE
-        self.draw_grid(canvas, grid)
+        self._renderer.draw(canvas)
 
 
 # Start interactive simulation    
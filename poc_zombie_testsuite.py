@@ -0,0 +1,370 @@
+"""
+Test suite for the Zombie Apocalypse simulation
+Note that tests are not exhaustive and should be supplemented
+"""
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import poc_simpletest
+
+
+def check_components(simulation):
+    """
+    Return True if the component labels of the simulation match a fresh
+    flood fill of its empty cells, up to renaming, and the stored
+    component sizes match the labels
+    """
+    height = simulation.get_grid_height()
+    width = simulation.get_grid_width()
+    renaming = {}
+    sizes = {}
+    seen = set()
+    for row in range(height):
+        for col in range(width):
+            label = simulation.get_component(row, col)
+            if not simulation.is_empty(row, col):
+                if label is not None:
+                    return False
+                continue
+            sizes[label] = sizes.get(label, 0) + 1
+            if (row, col) in seen:
+                continue
+            # flood the true component and check it carries one label
+            if label in renaming:
+                return False
+            renaming[label] = (row, col)
+            boundary = [(row, col)]
+            seen.add((row, col))
+            while boundary:
+                cell = boundary.pop()
+                if simulation.get_component(cell[0], cell[1]) != label:
+                    return False
+                for neighbor in simulation.four_neighbors(cell[0], cell[1]):
+                    if simulation.is_empty(neighbor[0], neighbor[1]) and neighbor not in seen:
+                        seen.add(neighbor)
+                        boundary.append(neighbor)
+    return sizes == simulation._component_sizes
+
+
+def run_component_tests(zombie_class, suite, trials=20):
+    """
+    Check the component labels under random obstacle edits
+    """
+    rng = random.Random(0)
+    for trial in range(trials):
+        height = rng.randint(1, 12)
+        width = rng.randint(1, 12)
+        obstacles = [(row, col) for row in range(height) for col in range(width)
+                     if rng.random() < 0.3]
+        simulation = zombie_class(height, width, obstacles)
+        suite.run_test(check_components(simulation), True,
+                       "Test #%d: components of the initial obstacles" % trial)
+        for edit in range(100):
+            row = rng.randrange(height)
+            col = rng.randrange(width)
+            if rng.random() < 0.5:
+                simulation.set_full(row, col)
+            else:
+                simulation.set_empty(row, col)
+            if not check_components(simulation):
+                suite.run_test(False, True,
+                               "Test #%d: components after edit %d at %s" % (trial, edit, (row, col)))
+                break
+
+
+class PickRandom:
+    """
+    Stand-in for random.Random that picks the first or the last move
+    and records the number of moves to choose from
+    """
+
+    def __init__(self, pick_last):
+        self._pick_last = pick_last
+        self.choices = []
+
+    def randint(self, low, high):
+        """
+        Return high if picking the last move, else low
+        """
+        self.choices.append(high - low + 1)
+        if self._pick_last:
+            return high
+        return low
+
+
+def move_agent(zombie_class, height, width, obstacles, zombies, humans, radius, pick_last):
+    """
+    Move the only human, or else the only zombie, of a simulation with
+    the field of the other agents capped at radius, or full if radius
+    is None
+
+    Returns the new cell of the agent and the numbers of moves it chose
+    from
+    """
+    picker = PickRandom(pick_last)
+    simulation = zombie_class(height, width, obstacles, zombies, humans, picker)
+    if len(humans) == 1:
+        simulation.move_humans(simulation.compute_distance_field("zombie", radius))
+        return list(simulation.humans())[0], picker.choices
+    simulation.move_zombies(simulation.compute_distance_field("human", radius))
+    return list(simulation.zombies())[0], picker.choices
+
+
+def run_field_tests(zombie_class, suite, trials=100):
+    """
+    Check that every agent within radius of the sources of a capped
+    distance field makes the same move as with the full field
+    """
+    rng = random.Random(1)
+    for trial in range(trials):
+        height = rng.randint(2, 12)
+        width = rng.randint(2, 12)
+        radius = rng.randint(1, 4)
+        obstacles = [(row, col) for row in range(height) for col in range(width)
+                     if rng.random() < 0.25]
+        empty_cells = [(row, col) for row in range(height) for col in range(width)
+                       if (row, col) not in obstacles]
+        if not empty_cells:
+            continue
+        zombies = [rng.choice(empty_cells) for dummy_idx in range(3)]
+        humans = [rng.choice(empty_cells) for dummy_idx in range(3)]
+        simulation = zombie_class(height, width, obstacles, zombies, humans)
+        zombie_distance = simulation.compute_distance_field("zombie")
+        human_distance = simulation.compute_distance_field("human")
+        agents = [(zombies, [human]) for human in humans if zombie_distance[human[0]][human[1]] <= radius]
+        agents.extend([([zombie], humans) for zombie in zombies
+                       if human_distance[zombie[0]][zombie[1]] <= radius])
+        for agent_zombies, agent_humans in agents:
+            for pick_last in (False, True):
+                suite.run_test(move_agent(zombie_class, height, width, obstacles, agent_zombies, agent_humans,
+                                          radius, pick_last),
+                               move_agent(zombie_class, height, width, obstacles, agent_zombies, agent_humans,
+                                          None, pick_last),
+                               "Test #%d: moves with radius %d, zombies %s, humans %s"
+                               % (trial, radius, agent_zombies, agent_humans))
+
+    # a sealed pocket diagonal to a zombie must not extend the search
+    pocket = (11, 11)
+    obstacles = [(10, 11), (12, 11), (11, 10), (11, 12)]
+    simulation = zombie_class(40, 40, obstacles, [(10, 10)], [pocket])
+    full_field = simulation.compute_distance_field("zombie")
+    near_cells = [(row, col) for row in range(40) for col in range(40)
+                  if simulation.is_empty(row, col) and full_field[row][col] <= 4]
+    capped_field = simulation.compute_distance_field("zombie", 2)
+    suite.run_test(len(capped_field), len(near_cells), "Test #%d: cells stored next to a sealed pocket" % trials)
+    suite.run_test(capped_field[pocket[0]][pocket[1]] > 4, True,
+                   "Test #%d: sealed pocket reads as far" % (trials + 1))
+
+
+class MockCanvas:
+    """
+    Canvas that keeps the color last painted in each cell, like a
+    canvas that is not cleared between frames
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.num_painted = 0
+
+    def draw_polygon(self, point_list, line_width, line_color, fill_color=None):
+        """
+        Record the cells of a row painted by a draw_cell call
+        """
+        cell_size = point_list[2][1] - point_list[1][1]
+        row = point_list[0][1] // cell_size
+        for col in range(point_list[0][0] // cell_size, point_list[1][0] // cell_size):
+            self.cells[(row, col)] = fill_color
+        self.num_painted += 1
+
+
+def expected_colors(simulation):
+    """
+    Return the color every cell of the simulation should have
+    """
+    humans = set(simulation.humans())
+    zombies = set(simulation.zombies())
+    colors = {}
+    for row in range(simulation.get_grid_height()):
+        for col in range(simulation.get_grid_width()):
+            if (row, col) in humans and (row, col) in zombies:
+                colors[(row, col)] = "Purple"
+            elif (row, col) in zombies:
+                colors[(row, col)] = "Red"
+            elif (row, col) in humans:
+                colors[(row, col)] = "Green"
+            elif not simulation.is_empty(row, col):
+                colors[(row, col)] = "Black"
+            else:
+                colors[(row, col)] = "White"
+    return colors
+
+
+def run_renderer_tests(renderer_class, zombie_class, suite, frames=200):
+    """
+    Check the repaint counts of the renderer and that a persistent
+    canvas shows the simulation after every frame
+    """
+    simulation = zombie_class(6, 8, [(1, 1), (4, 5)], [(0, 0)], [(5, 7), (3, 3)])
+    renderer = renderer_class(simulation, True)
+    canvas = MockCanvas()
+    renderer.draw(canvas)
+    suite.run_test(renderer.get_repaint_count(), 48, "Test #1: first frame repaints every cell")
+    renderer.draw(canvas)
+    suite.run_test(renderer.get_repaint_count(), 0, "Test #2: unchanged frame repaints nothing")
+    simulation.move_zombies(simulation.compute_distance_field("human"))
+    renderer.draw(canvas)
+    suite.run_test(renderer.get_repaint_count(), 2, "Test #3: a zombie move repaints two cells")
+    simulation.set_full(2, 2)
+    renderer.mark_dirty(2, 2)
+    renderer.draw(canvas)
+    suite.run_test(renderer.get_repaint_count(), 1, "Test #4: a marked obstacle repaints one cell")
+    simulation.set_full(2, 4)
+    simulation.move_zombies(simulation.compute_distance_field("human"))
+    renderer.draw(canvas)
+    suite.run_test(renderer.get_repaint_count(), 48, "Test #5: an unmarked obstacle repaints every cell")
+    suite.run_test(canvas.cells, expected_colors(simulation), "Test #6: canvas after an unmarked obstacle")
+
+    rng = random.Random(2)
+    for frame in range(frames):
+        action = rng.randrange(6)
+        row = rng.randrange(6)
+        col = rng.randrange(8)
+        occupied = (row, col) in list(simulation.humans()) + list(simulation.zombies())
+        if action == 0 and not occupied:
+            simulation.set_full(row, col)
+            renderer.mark_dirty(row, col)
+        elif action == 1:
+            simulation.set_empty(row, col)
+            if rng.random() < 0.5:
+                renderer.mark_dirty(row, col)
+        elif action == 2:
+            simulation.move_humans(simulation.compute_distance_field("zombie"))
+        elif action == 3:
+            simulation.move_zombies(simulation.compute_distance_field("human"))
+        elif action == 4 and simulation.is_empty(row, col):
+            simulation.add_human(row, col)
+        elif action == 5:
+            simulation.clear()
+            renderer.request_full_repaint()
+        renderer.draw(canvas)
+        if canvas.cells != expected_colors(simulation):
+            suite.run_test(canvas.cells, expected_colors(simulation), "Test #7: canvas after frame %d" % frame)
+            break
+
+
+def run_cleared_renderer_tests(renderer_class, zombie_class, suite, frames=200):
+    """
+    Check the repaint and draw counts of the renderer on a canvas that
+    is cleared between frames and that every frame shows the simulation
+    """
+    obstacles = [(1, col) for col in range(1, 7)] + [(4, 5)]
+    simulation = zombie_class(6, 8, obstacles, [(0, 0)], [(5, 7), (3, 3)])
+    renderer = renderer_class(simulation)
+    renderer.draw(MockCanvas())
+    suite.run_test(renderer.get_repaint_count(), 48, "Test #1: first frame recomputes every cell")
+    suite.run_test(renderer.get_draw_count(), 5, "Test #2: a row of obstacles is drawn as one polygon")
+    renderer.draw(MockCanvas())
+    suite.run_test(renderer.get_repaint_count(), 0, "Test #3: unchanged frame recomputes nothing")
+    suite.run_test(renderer.get_draw_count(), 5, "Test #4: unchanged frame draws the cached rows")
+    simulation.move_zombies(simulation.compute_distance_field("human"))
+    renderer.draw(MockCanvas())
+    suite.run_test(renderer.get_repaint_count(), 2, "Test #5: a zombie move recomputes two cells")
+    simulation.set_full(1, 7)
+    renderer.mark_dirty(1, 7)
+    renderer.draw(MockCanvas())
+    suite.run_test(renderer.get_repaint_count(), 1, "Test #6: a marked obstacle recomputes one cell")
+    suite.run_test(renderer.get_draw_count(), 5, "Test #7: a marked obstacle extends its run")
+    simulation.set_empty(1, 3)
+    renderer.draw(MockCanvas())
+    suite.run_test(renderer.get_repaint_count(), 48, "Test #8: an unmarked obstacle recomputes every cell")
+    suite.run_test(renderer.get_draw_count(), 6, "Test #9: an emptied cell splits its run")
+
+    rng = random.Random(3)
+    for frame in range(frames):
+        action = rng.randrange(5)
+        row = rng.randrange(6)
+        col = rng.randrange(8)
+        occupied = (row, col) in list(simulation.humans()) + list(simulation.zombies())
+        if action == 0 and not occupied:
+            simulation.set_full(row, col)
+            renderer.mark_dirty(row, col)
+        elif action == 1:
+            simulation.set_empty(row, col)
+            renderer.mark_dirty(row, col)
+        elif action == 2:
+            simulation.move_humans(simulation.compute_distance_field("zombie"))
+        elif action == 3:
+            simulation.move_zombies(simulation.compute_distance_field("human"))
+        elif action == 4 and simulation.is_empty(row, col):
+            simulation.add_zombie(row, col)
+        canvas = MockCanvas()
+        renderer.draw(canvas)
+        expected = dict([(cell, color) for cell, color in expected_colors(simulation).items()
+                         if color != "White"])
+        if canvas.cells != expected:
+            suite.run_test(canvas.cells, expected, "Test #10: cleared canvas after frame %d" % frame)
+            break
+        if renderer.get_repaint_count() == 48:
+            suite.run_test(renderer.get_repaint_count() < 48, True,
+                           "Test #11: marked edits recompute some cells in frame %d" % frame)
+            break
+
+
+def run_batch_tests(run_batch, suite):
+    """
+    Check that a batch interrupted in the middle of writing a result
+    resumes and aggregates every scenario
+    """
+    specs = [{"height": 8, "width": 8, "num_humans": 4, "num_zombies": 2, "steps": 10, "seed": seed}
+             for seed in range(4)]
+    directory = tempfile.mkdtemp()
+    try:
+        results_file = os.path.join(directory, "results.jsonl")
+        expected = run_batch(specs, results_file, 1)
+        with open(os.path.join(directory, "results.summary.json")) as summary_input:
+            suite.run_test(json.load(summary_input)["survival"], expected, "Test #1: batch summary file")
+
+        # keep two results and half of a third one, as after a crash
+        with open(results_file) as results_input:
+            lines = results_input.readlines()
+        with open(results_file, "w") as results_output:
+            results_output.writelines(lines[:2])
+            results_output.write(lines[2][:len(lines[2]) // 2])
+        suite.run_test(run_batch(specs, results_file, 1), expected, "Test #2: resumed batch")
+        with open(results_file) as results_input:
+            records = [json.loads(line) for line in results_input]
+        suite.run_test(sorted([record["id"] for record in records]), list(range(len(specs))),
+                       "Test #3: results after resuming")
+
+        # scenarios without a seed get distinct seeds from their ids
+        unseeded_file = os.path.join(directory, "unseeded.jsonl")
+        unseeded_specs = [dict(spec, seed=None) for spec in specs]
+        unseeded_specs.extend([{"id": "a", "steps": 1}, {"id": "b", "steps": 1}])
+        expected = run_batch(unseeded_specs, unseeded_file, 1)
+        with open(unseeded_file) as results_input:
+            seeds = [json.loads(line)["spec"]["seed"] for line in results_input]
+        suite.run_test(len(set(seeds)), len(unseeded_specs), "Test #4: distinct seeds of unseeded scenarios")
+        os.remove(unseeded_file)
+        suite.run_test(run_batch(unseeded_specs, unseeded_file, 1), expected,
+                       "Test #5: unseeded batch run again")
+    finally:
+        shutil.rmtree(directory)
+
+
+def run_suite(zombie_class, run_batch=None, renderer_class=None):
+    """
+    Some informal testing code for the Zombie class, and for the batch
+    runner and the GUI renderer if they are given
+    """
+    suite = poc_simpletest.TestSuite()
+    run_component_tests(zombie_class, suite)
+    run_field_tests(zombie_class, suite)
+    if renderer_class is not None:
+        run_renderer_tests(renderer_class, zombie_class, suite)
+        run_cleared_renderer_tests(renderer_class, zombie_class, suite)
+    if run_batch is not None:
+        run_batch_tests(run_batch, suite)
+    suite.report_results()